@@ -0,0 +1,83 @@
+import json
+
+# Formát článků v seznamu data_idnes_articles. Původně JSON řetězec (json.dumps), kompaktní varianta je
+# msgpack mapa komprimovaná zstd se slovníkem natrénovaným na vzorku článků - krátké texty se samostatně
+# komprimují špatně, slovník s typickými slovy, názvy klíčů a kategoriemi z toho udělá několikanásobnou úsporu.
+# JSON záznam vždy začíná "{", binární záznam značkou MSGPACK_ZSTD, takže staré i nové záznamy jdou číst
+# jedním codecem a v jednom seznamu můžou být oba formáty.
+#
+# zstd frame nese id slovníku, kterým byl komprimovaný. Slovníky jsou v Redisu (hash article_dictionaries),
+# takže po přetrénování jdou pořád číst i články komprimované starším slovníkem.
+
+CODECS = ("json", "msgpack")
+MSGPACK_ZSTD = b"\x01"
+DICTIONARY_SIZE = 112640
+
+
+def train_dictionary(articles: list[dict], dict_size=DICTIONARY_SIZE) -> bytes:
+    """
+    Natrénuje zstd slovník na msgpack podobě [articles], pro rozumný slovník je potřeba aspoň pár tisíc článků
+    """
+    # msgpack a zstandard jsou potřeba jen pro kompaktní formát
+    import msgpack
+    import zstandard
+    return zstandard.train_dictionary(dict_size, [msgpack.packb(article) for article in articles]).as_bytes()
+
+
+class ArticleCodec:
+    """
+    Kóduje články pro zápis do Redisu a čte oba formáty. Instance není thread safe (zstd kontexty),
+    každý DataStore má vlastní
+    [codec] = {json, msgpack} - formát nových záznamů
+    [dictionary] - zstd slovník pro zápis, bez něj se komprimuje bez slovníku
+    [fetch_dictionary] - funkce dict_id -> bytes pro čtení záznamů komprimovaných jiným slovníkem
+    """
+    def __init__(self, codec="json", dictionary: bytes | None = None, level=3, fetch_dictionary=None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown article codec {codec}, use one of {list(CODECS)}")
+        self.codec = codec
+        self.level = level
+        self.fetch_dictionary = fetch_dictionary
+        self.dictionary_id = 0
+        self.__compressor = None
+        self.__decompressors = {}
+        if codec == "msgpack":
+            import zstandard
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            if dict_data is not None:
+                self.dictionary_id = dict_data.dict_id()
+                self.__decompressors[self.dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+            self.__compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+
+    def encode(self, article: dict) -> str | bytes:
+        if self.codec == "json":
+            return json.dumps(article)
+        import msgpack
+        return MSGPACK_ZSTD + self.__compressor.compress(msgpack.packb(article))
+
+    def decode(self, raw: str | bytes) -> dict:
+        if isinstance(raw, str) or raw[:1] != MSGPACK_ZSTD:
+            return json.loads(raw)
+        import msgpack
+        frame = memoryview(raw)[1:]
+        return msgpack.unpackb(self.__decompressor(frame).decompress(frame))
+
+    def to_json(self, raw: str | bytes) -> str:
+        """
+        Záznam jako JSON řetězec pro exporty - JSON záznam se vrátí beze změny, bez json.loads
+        """
+        if isinstance(raw, str):
+            return raw
+        if raw[:1] != MSGPACK_ZSTD:
+            return raw.decode("utf-8")
+        return json.dumps(self.decode(raw))
+
+    def __decompressor(self, frame):
+        import zstandard
+        dict_id = zstandard.get_frame_parameters(frame).dict_id
+        if dict_id not in self.__decompressors:
+            dictionary = self.fetch_dictionary(dict_id) if dict_id and self.fetch_dictionary else None
+            if dict_id and dictionary is None:
+                raise ValueError(f"Missing zstd dictionary {dict_id} for the article")
+            self.__decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None)
+        return self.__decompressors[dict_id]
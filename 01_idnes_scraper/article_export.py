@@ -0,0 +1,116 @@
+import os
+import gzip
+import json
+import logging
+
+# Streamovaný export článků z Redisu do NDJSON (jeden článek = jeden řádek). Články jsou v Redisu už jako JSON
+# řetězce, takže se jen spojí novými řádky a zapíšou - žádné json.loads/json.dump a v paměti je vždy jen jedna dávka.
+#
+# Každá dávka se zapíše jako samostatný gzip member / zstd frame. Zřetězené membery/framy jsou pořád platný
+# soubor, takže export jde po pádu navázat: v <soubor>.offset je index dalšího článku a délka souboru po poslední
+# dokončené dávce. Cokoli za touto délkou (useknutá dávka) se při navázání ořízne.
+
+logger = logging.getLogger("scraper.export")
+
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _compressor(compression: str | None, level: int | None):
+    if compression is None:
+        return lambda data: data
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=level or 6)
+    if compression == "zstd":
+        # Volitelná závislost, potřeba jen pro zstd export
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level or 3)
+        return compressor.compress
+    raise ValueError(f"Unknown compression {compression}, use one of {list(COMPRESSIONS)}")
+
+
+def shard_path(output_file: str, shard: int, shards: int, compression: str | None = None) -> str:
+    """
+    Jméno souboru shardu, např. idnes_articles-00001-of-00004.ndjson.gz
+    """
+    base, extension = os.path.splitext(output_file)
+    if shards > 1:
+        base = f"{base}-{shard:05d}-of-{shards:05d}"
+    return f"{base}{extension or '.ndjson'}{COMPRESSIONS[compression]}"
+
+
+def shard_range(total: int, shard: int, shards: int) -> tuple[int, int]:
+    """
+    Shardy jsou souvislé rozsahy indexů v seznamu článků, [start, end)
+    """
+    return total * shard // shards, total * (shard + 1) // shards
+
+
+def read_offset(path: str) -> dict | None:
+    """
+    Pozice nedokončeného exportu, None když soubor nemá .offset nebo je export hotový (starší verze .offset nemazala)
+    """
+    try:
+        with open(f"{path}.offset", "r", encoding="utf-8") as file:
+            offset = json.load(file)
+    except FileNotFoundError:
+        return None
+    return offset if offset["next"] < offset["end"] else None
+
+
+def _write_offset(path: str, offset: dict) -> None:
+    tmp_path = f"{path}.offset.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(offset, file)
+    os.replace(tmp_path, f"{path}.offset")
+
+
+def export_range(batches, path: str, start: int, end: int, compression: str | None = None, level: int | None = None, resume=True) -> int:
+    """
+    Zapíše články [start, end) do jednoho souboru, vrací počet zapsaných článků
+    [batches] - funkce (start, end) -> iterátor dávek JSON řetězců, typicky DataStore.iter_article_batches
+    [resume] - navázat podle <path>.offset, jinak se soubor přepíše od začátku
+    """
+    compress = _compressor(compression, level)
+    offset = read_offset(path) if resume and os.path.exists(path) else None
+    position, size = (offset["next"], offset["size"]) if offset else (start, 0)
+
+    written = 0
+    with open(path, "r+b" if offset else "wb") as file:
+        file.truncate(size)
+        file.seek(size)
+        for batch in batches(position, end):
+            file.write(compress(("\n".join(batch) + "\n").encode("utf-8")))
+            file.flush()
+            os.fsync(file.fileno())
+            position += len(batch)
+            written += len(batch)
+            _write_offset(path, {"next": position, "size": file.tell(), "start": start, "end": end})
+            logger.info(f"[export] {path}: {position - start}/{end - start}")
+
+    # Hotový export už nemá na co navazovat, další spuštění exportuje aktuální seznam znovu
+    if os.path.exists(f"{path}.offset"):
+        os.remove(f"{path}.offset")
+    return written
+
+
+def export_ndjson(store, output_file="idnes_articles_data.ndjson", batch_size=10000, compression: str | None = None, level: int | None = None,
+                  shards=1, shard: int | None = None, resume=True) -> list[str]:
+    """
+    Exportuje seznam článků do [shards] souborů NDJSON, vrací cesty k nim.
+    Rozsahy shardů se počítají z délky seznamu při prvním spuštění (uloží se do .offset), takže články
+    přidané během exportu do už rozjetého exportu nespadnou. Po dokončení shardu se .offset smaže a další
+    spuštění exportuje shard znovu včetně nových článků.
+    [shard] - exportovat jen jeden shard, aby šly shardy pouštět paralelně v samostatných procesech
+    """
+    total = store.count_articles()
+    batches = lambda start, end: store.iter_article_batches(start, end, batch_size)
+    paths = []
+
+    for index in range(shards) if shard is None else [shard]:
+        path = shard_path(output_file, index, shards, compression)
+        offset = read_offset(path) if resume else None
+        start, end = (offset["start"], offset["end"]) if offset else shard_range(total, index, shards)
+        export_range(batches, path, start, end, compression, level, resume)
+        paths.append(path)
+
+    return paths
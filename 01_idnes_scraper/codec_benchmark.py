@@ -0,0 +1,74 @@
+import os
+import sys
+import argparse
+from itertools import islice
+from time import perf_counter
+from article_codec import ArticleCodec, train_dictionary, DICTIONARY_SIZE
+
+# Čtení exportů (JSON pole, NDJSON, .gz/.zst) je sdílené s analýzou dat
+ANALYSIS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data"))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_DIR)
+from stats_engine import read_shard
+
+# Velikost a rychlost formátů článků v Redisu (viz article_codec.py) nad exportem článků. Slovník se trénuje
+# na prvních --train článcích a měří se na zbytku, aby výsledek nebyl přeceněný slovníkem z těch samých dat.
+
+
+def load_sample(paths: list[str], limit: int) -> list[dict]:
+    articles = []
+    for path in paths:
+        articles.extend(islice(read_shard(path), limit - len(articles)))
+        if len(articles) >= limit:
+            break
+    return articles
+
+
+def measure(codec: ArticleCodec, articles: list[dict], repeat: int) -> dict[str, float]:
+    encoded = [codec.encode(article) for article in articles]
+    size = sum(len(raw if isinstance(raw, bytes) else raw.encode("utf-8")) for raw in encoded)
+
+    started = perf_counter()
+    for _ in range(repeat):
+        for article in articles:
+            codec.encode(article)
+    encode_time = (perf_counter() - started) / repeat
+
+    started = perf_counter()
+    for _ in range(repeat):
+        for raw in encoded:
+            codec.decode(raw)
+    decode_time = (perf_counter() - started) / repeat
+
+    return {"bytes": size / len(articles), "encode": len(articles) / encode_time, "decode": len(articles) / decode_time}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes per article and encode/decode throughput of the article codecs")
+    parser.add_argument("inputs", nargs="+", help="JSON array, NDJSON or .gz/.zst dumps")
+    parser.add_argument("--sample", type=int, default=20000, help="articles to load")
+    parser.add_argument("--train", type=int, default=5000, help="articles from the sample used to train the dictionary")
+    parser.add_argument("--dict-size", type=int, default=DICTIONARY_SIZE)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    articles = load_sample(args.inputs, args.sample)
+    training, articles = articles[:args.train], articles[args.train:]
+    if not articles:
+        raise SystemExit(f"Need more than --train={args.train} articles, got {len(training)}")
+
+    started = perf_counter()
+    dictionary = train_dictionary(training, args.dict_size)
+    print(f"Trained {len(dictionary)} B dictionary on {len(training)} articles in {perf_counter() - started:.1f} s, measuring on {len(articles)} articles")
+
+    codecs = {
+        "json": ArticleCodec("json"),
+        "msgpack+zstd": ArticleCodec("msgpack", level=args.level),
+        "msgpack+zstd+dict": ArticleCodec("msgpack", dictionary, level=args.level),
+    }
+    results = {name: measure(codec, articles, args.repeat) for name, codec in codecs.items()}
+
+    print(f"{'codec':>18} {'B/article':>10} {'ratio':>6} {'encode/s':>10} {'decode/s':>10}")
+    for name, result in results.items():
+        print(f"{name:>18} {result['bytes']:10.0f} {results['json']['bytes'] / result['bytes']:5.2f}x {result['encode']:10.0f} {result['decode']:10.0f}")
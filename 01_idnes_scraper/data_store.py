@@ -1,84 +1,748 @@
 import json
+import time
+import logging
 import redis
+import asyncio
+import redis.asyncio
+from article_export import export_ndjson
+from frontier import UrlFrontier
+from article_codec import ArticleCodec, train_dictionary
+from metrics import Metrics
+
+logger = logging.getLogger("scraper")
+
+# Token bucket - čas bereme z Redisu, aby se všechny stroje řídily stejnými hodinami. Vrací počet ms, které je potřeba počkat
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+# Přesun URL, kterým už vypršel backoff, z retry zsetu zpět do fronty
+REQUEUE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('RPUSH', KEYS[2], unpack(due))
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return #due
+"""
+
+# Vrácení jedné URL z working_queue (už odebrané ze seznamu) do fronty, po max_retries pokusech jde URL i s poslední
+# chybou do dead letter seznamu. Společný začátek REAP_SCRIPT a DRAIN_SCRIPT, klíče a ARGV[1..2] mají oba stejné:
+# KEYS = working_queue, fronta, leases, pokusy, chyby, dead letter; ARGV[1] = teď, ARGV[2] = max_retries
+REQUEUE_URL_LUA = """
+local now = tonumber(ARGV[1])
+local max_retries = tonumber(ARGV[2])
+local function requeue(url)
+    redis.call('ZREM', KEYS[3], KEYS[1] .. '\t' .. url)
+    local attempts = redis.call('HINCRBY', KEYS[4], url, 1)
+    if attempts > max_retries then
+        local error = redis.call('HGET', KEYS[5], url) or 'lease expired'
+        redis.call('RPUSH', KEYS[6], cjson.encode({url = url, queue = KEYS[2], attempts = attempts, error = error, time = now}))
+        redis.call('HDEL', KEYS[4], url)
+        redis.call('HDEL', KEYS[5], url)
+    else
+        redis.call('LPUSH', KEYS[2], url)
+    end
+end
+"""
+
+# Reaper živého workera - URL, které jsou v jeho working_queue déle než visibility timeout (ARGV[3]), vrátí do fronty.
+# Čas zapůjčení se zapíše při prvním průchodu reaperu, takže hot path workera nic nestojí. Fronta workera má
+# nanejvýš desítky URL, LREM pro každou vypršelou je tu levný
+REAP_SCRIPT = REQUEUE_URL_LUA + """
+local visibility_timeout = tonumber(ARGV[3])
+local moved = 0
+for _, url in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local member = KEYS[1] .. '\t' .. url
+    local leased_at = redis.call('ZSCORE', KEYS[3], member)
+    if not leased_at then
+        redis.call('ZADD', KEYS[3], now, member)
+    elseif now - tonumber(leased_at) > visibility_timeout then
+        redis.call('LREM', KEYS[1], -1, url)
+        requeue(url)
+        moved = moved + 1
+    end
+end
+return moved
+"""
+
+# Vyprázdnění working_queue mrtvého workera nebo starého sdíleného working_queue (po pádu klidně miliony URL) -
+# jeden kus o ARGV[3] nejstarších URL z konce seznamu, aby jedno volání skriptu neblokovalo Redis dlouho
+DRAIN_SCRIPT = REQUEUE_URL_LUA + """
+local urls = redis.call('LRANGE', KEYS[1], -tonumber(ARGV[3]), -1)
+if #urls == 0 then
+    return 0
+end
+redis.call('LTRIM', KEYS[1], 0, -#urls - 1)
+for i = #urls, 1, -1 do
+    requeue(urls[i])
+end
+return #urls
+"""
+
+# Kolik URL vrací do fronty jedno volání DRAIN_SCRIPT
+DRAIN_CHUNK = 1000
+
+# Zápis MinHash pásem článku a výběr kandidátů na duplicitu v jednom kroku - dva podobné články zpracovávané
+# souběžně se tak vždy vidí navzájem (pozdější dostane dřívější jako kandidáta). Pásmo zůstává u prvního článku.
+# KEYS[1] = lsh_buckets, KEYS[2] = lsh_signatures, ARGV[1] = URL, ARGV[2] = signatura, ARGV[3..] = pásma.
+# Vrací [URL kandidáta, jeho signatura, ...]
+LSH_ADD_SCRIPT = """
+local candidates = {}
+local seen = {}
+for i = 3, #ARGV do
+    local owner = redis.call('HGET', KEYS[1], ARGV[i])
+    if not owner then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[1])
+    elseif owner ~= ARGV[1] and not seen[owner] then
+        seen[owner] = true
+        candidates[#candidates + 1] = owner
+        candidates[#candidates + 1] = redis.call('HGET', KEYS[2], owner) or ''
+    end
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+return candidates
+"""
+
+# Odebrání pásem a signatury článku, který se ukázal jako duplicita - jen pásma, která článek zabral
+LSH_REMOVE_SCRIPT = """
+for i = 2, #ARGV do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return redis.call('HDEL', KEYS[2], ARGV[1])
+"""
+
+# Stránka 1 archivu jsou nejnovější články
+ARCHIVE_URL = "https://www.idnes.cz/zpravy/archiv/{}?datum=&idostrova=idnes"
+ARCHIVE_PAGES = 40398
+
+def _release_urls(pipeline, store, urls: list[str], forget_attempts=True) -> None:
+    """
+    Přidá do pipeline odebrání URL z working_queue workera a smazání jejich zápůjčky (lease),
+    při úspěchu i počtu pokusů a poslední chyby
+    """
+    # BRPOPLPUSH vkládá na začátek seznamu, nejstarší rozpracované URL jsou na konci - LREM s -1 hledá od konce
+    for url in urls:
+        pipeline.lrem(store.working_queue, -1, url)
+    pipeline.zrem(store.leases, *[f"{store.working_queue}\t{url}" for url in urls])
+    if forget_attempts:
+        pipeline.hdel(store.retry_attempts, *urls)
+        pipeline.hdel(store.url_errors, *urls)
+
+
+def _dead_letter_entry(url: str, queue: str, error: str, attempts: int) -> str:
+    return json.dumps({"url": url, "queue": queue, "attempts": attempts, "error": error, "time": time.time()}, ensure_ascii=False)
+
 
 class DataStore:
-    def __init__(self, host = "localhost", password="", port=6378, working_queue="working_queue", error_list="error_list", article_list = "data_idnes_articles", urls_list = "data_idnes_urls", articles_queue = "articles_queue", archive_queue="archive_queue"):
+    def __init__(self, host = "localhost", password="", port=6378, working_queue="working_queue", error_list="error_list", article_list = "data_idnes_articles", urls_list = "data_idnes_urls", articles_queue = "articles_queue", archive_queue="archive_queue", retry_attempts="url_attempts", worker_id=None, url_errors="url_errors", dead_letter="dead_letter", leases="url_leases", workers="scraper_workers", heartbeats="scraper_heartbeats",
+                 lsh_buckets="lsh_buckets", lsh_signatures="lsh_signatures", duplicates="duplicate_articles", frontier="hash",
+                 article_codec="json", dictionaries="article_dictionaries", metrics: Metrics = None):
         self.host = host
         self.port = port
         self.password = password
-        self.working_queue = working_queue
+        # Každý worker má vlastní working_queue - je krátká, takže LREM při potvrzení je prakticky O(1)
+        self.worker_id = worker_id
+        self.working_queue_prefix = working_queue
+        self.working_queue = f"{working_queue}:{worker_id}" if worker_id else working_queue
         self.error_list = error_list
         self.article_list = article_list
         self.urls_list = urls_list
         self.articles_queue = articles_queue
         self.archive_queue = archive_queue
+        self.retry_attempts = retry_attempts
+        self.url_errors = url_errors
+        self.dead_letter = dead_letter
+        self.leases = leases
+        self.workers = workers
+        self.heartbeats = heartbeats
+        self.lsh_buckets = lsh_buckets
+        self.lsh_signatures = lsh_signatures
+        self.duplicates = duplicates
+        # Už viděné URL - hashe, Bloom filtr nebo původní množina celých URL, viz frontier.py
+        self.frontier = UrlFrontier(urls_list, mode=frontier)
+        self.dictionaries = dictionaries
+        # Doba zápisů a potvrzení v Redisu, scraper předává jeden objekt všem svým DataStore
+        self.metrics = metrics or Metrics()
         self.__redis_client = self._create_redis_client()
+        # Články můžou být binární (viz article_codec.py), čtou se klientem bez dekódování odpovědí. Klient i codec
+        # (se slovníkem z Redisu) vznikají až při prvním použití, worker s JSON články je nepotřebuje
+        self.__binary_client = None
+        self.__article_codec = article_codec
+        self.__codec = None
+        self.__token_bucket = self.__redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.__requeue_due = self.__redis_client.register_script(REQUEUE_DUE_SCRIPT)
+        self.__reap = self.__redis_client.register_script(REAP_SCRIPT)
+        self.__drain = self.__redis_client.register_script(DRAIN_SCRIPT)
+        self.__lsh_add = self.__redis_client.register_script(LSH_ADD_SCRIPT)
+        self.__lsh_remove = self.__redis_client.register_script(LSH_REMOVE_SCRIPT)
+        self.__mark_seen = self.__redis_client.register_script(self.frontier.script)
 
-    def _create_redis_client(self, db=0, charset="utf-8") -> redis.Redis:
-        return redis.Redis(host=self.host, port=self.port, db=db, charset=charset, password=self.password, decode_responses=True, single_connection_client=False)
+    def _create_redis_client(self, db=0, charset="utf-8", decode_responses=True) -> redis.Redis:
+        return redis.Redis(host=self.host, port=self.port, db=db, charset=charset, password=self.password, decode_responses=decode_responses, single_connection_client=False)
 
-    def save_article(self, article) -> int:
-       return self.__redis_client.rpush(self.article_list, json.dumps(article))
-    
-    def save_urls(self, urls: list[str]):
-        pipeline = self.__redis_client.pipeline()
+    def __binary(self) -> redis.Redis:
+        if self.__binary_client is None:
+            self.__binary_client = self._create_redis_client(decode_responses=False)
+        return self.__binary_client
 
-        for url in urls:
-            pipeline.sadd(self.urls_list, url)
-        
-        set_results = pipeline.execute()
+    @property
+    def codec(self) -> ArticleCodec:
+        if self.__codec is None:
+            self.__codec = self.create_codec(self.__article_codec)
+        return self.__codec
 
-        pipeline = self.__redis_client.pipeline()
+    def create_codec(self, codec="json") -> ArticleCodec:
+        """
+        Nový codec článků, [codec] = {json, msgpack}. Pro msgpack se načte aktuální slovník z Redisu,
+        slovníky pro čtení starších záznamů se načítají až podle potřeby
+        """
+        fetch_dictionary = lambda dict_id: self.__binary().hget(self.dictionaries, str(dict_id))
+        if codec != "msgpack":
+            return ArticleCodec(codec, fetch_dictionary=fetch_dictionary)
+        active = self.__binary().hget(self.dictionaries, "active")
+        dictionary = self.__binary().hget(self.dictionaries, active) if active else None
+        return ArticleCodec(codec, dictionary, fetch_dictionary=fetch_dictionary)
 
-        for i, url in enumerate(urls):
-            if set_results[i] == 1:  # Check if SADD added the URL successfully
-                pipeline.rpush(self.articles_queue, url)
-          
+    def train_article_dictionary(self, sample_size=10000, dict_size=112640) -> int:
+        """
+        Natrénuje zstd slovník na vzorku uložených článků (rovnoměrně z celého seznamu), uloží ho do Redisu jako
+        aktivní a vrátí jeho id. Ostatní scrapery ho začnou používat po restartu
+        """
+        total = self.count_articles()
+        step = max(1, total // sample_size)
+        pipeline = self.__binary().pipeline(transaction=False)
+        for index in range(0, total, step):
+            pipeline.lindex(self.article_list, index)
+        samples = [self.codec.decode(raw) for raw in pipeline.execute() if raw is not None]
 
-        pipeline.execute()
+        dictionary = train_dictionary(samples, dict_size)
+        codec = ArticleCodec("msgpack", dictionary)
+        self.__binary().hset(self.dictionaries, mapping={str(codec.dictionary_id): dictionary, "active": str(codec.dictionary_id)})
+        self.__codec = self.create_codec(self.__article_codec)
+        return codec.dictionary_id
+
+    def save_article(self, article) -> int:
+       return self.__redis_client.rpush(self.article_list, self.codec.encode(article))
+    
+    def save_articles(self, articles: list[dict]) -> int:
+        """
+        Uloží více článků jedním RPUSH
+        """
+        if not articles:
+            return self.__redis_client.llen(self.article_list)
+        return self.__redis_client.rpush(self.article_list, *[self.codec.encode(article) for article in articles])
 
-    def get_url_to_scrape(self, queue: str) -> str:
+    def save_urls(self, urls: list[str]) -> int:
+        """
+        Kanonizuje URL a do articles_queue zařadí jen ty, které ještě nikdo neviděl - jedno EVALSHA na celou dávku.
+        Vrací počet nových URL
+        """
+        script_args = self.frontier.script_args(self.articles_queue, urls)
+        if script_args is None:
+            return 0
+        keys, args = script_args
+        with self.metrics.timer("save_urls"):
+            added = self.__mark_seen(keys=keys, args=args)
+        self.metrics.inc("urls_new", added)
+        return added
+
+    def get_url_to_scrape(self, queue: str, timeout=10) -> str:
         """
         [queue] = {articles_queue, archive_queue}
         """
-        return self.__redis_client.brpoplpush(queue, self.working_queue, 10)
+        return self.__redis_client.brpoplpush(queue, self.working_queue, timeout)
     
     def ack_scrape(self, url: str):
-        self.__redis_client.lrem(self.working_queue, 0, url)
+        self.ack_scrape_batch([url])
+
+    def ack_scrape_batch(self, urls: list[str]):
+        if not urls:
+            return
+        pipeline = self.__redis_client.pipeline()
+        _release_urls(pipeline, self, urls)
+        with self.metrics.timer("ack_scrape"):
+            pipeline.execute()
+
+    def save_and_ack(self, items: list[tuple[str, dict]]) -> None:
+        """
+        Uloží články a potvrdí jejich URL v jedné transakci (MULTI/EXEC) - jeden round trip na celou dávku
+        [items] - dvojice (url, článek)
+        """
+        if not items:
+            return
+        pipeline = self.__redis_client.pipeline(transaction=True)
+        pipeline.rpush(self.article_list, *[self.codec.encode(article) for _, article in items])
+        _release_urls(pipeline, self, [url for url, _ in items])
+        # Uložení i potvrzení je jedna transakce, čas je za celou dávku
+        with self.metrics.timer("save_article"):
+            pipeline.execute()
+        self.metrics.inc("articles_saved", len(items))
+
+    def save_urls_and_ack(self, pages: list[tuple[str, list[str]]]) -> None:
+        """
+        Uloží adresy článků z několika stránek archivu a potvrdí stránky
+        [pages] - dvojice (url stránky archivu, adresy článků)
+        """
+        if not pages:
+            return
+        self.save_urls([url for _, urls in pages for url in urls])
+        self.ack_scrape_batch([url for url, _ in pages])
 
     def log_error(self, message: str) -> None:
         self.__redis_client.rpush(self.error_list,message)
-        print(message)
+        logger.warning(message)
+
+    def queue_depths(self) -> dict[str, int]:
+        """
+        Počet URL ve frontách a rozpracovaných URL ve working_queue všech registrovaných workerů
+        """
+        working_queues = self.__redis_client.hkeys(self.workers)
+        pipeline = self.__redis_client.pipeline(transaction=False)
+        pipeline.llen(self.articles_queue)
+        pipeline.llen(self.archive_queue)
+        for working_queue in working_queues:
+            pipeline.llen(working_queue)
+        articles, archive, *working = pipeline.execute()
+        return {"articles_queue": articles, "archive_queue": archive, "working_queue": sum(working)}
+
+    def take_token(self, key: str, rate: float, capacity: int) -> int:
+        """
+        Vezme token ze sdíleného token bucketu [key], vrací počet ms, po které je potřeba počkat (0 = můžeme jet)
+        """
+        return int(self.__token_bucket(keys=[key], args=[rate, capacity]))
+
+    def register_failure(self, url: str, error: str = "") -> int:
+        """
+        Zvýší počet neúspěšných pokusů o URL, zapamatuje si poslední chybu a vrátí počet pokusů
+        """
+        pipeline = self.__redis_client.pipeline()
+        pipeline.hincrby(self.retry_attempts, url, 1)
+        pipeline.hset(self.url_errors, url, error)
+        return pipeline.execute()[0]
+
+    def schedule_retry(self, url: str, queue: str, delay: float) -> None:
+        """
+        Vyřadí URL z working_queue a za [delay] sekund ji vrátí do [queue]
+        """
+        pipeline = self.__redis_client.pipeline()
+        pipeline.zadd(f"{queue}:retry", {url: time.time() + delay})
+        _release_urls(pipeline, self, [url], forget_attempts=False)
+        pipeline.execute()
+
+    def move_to_dead_letter(self, url: str, queue: str, error: str, attempts: int) -> None:
+        """
+        URL, která selhala víc než max_retries krát, vyřadí z fronty do dead letter seznamu i s chybou
+        """
+        pipeline = self.__redis_client.pipeline()
+        pipeline.rpush(self.dead_letter, _dead_letter_entry(url, queue, error, attempts))
+        _release_urls(pipeline, self, [url])
+        pipeline.execute()
+
+    def requeue_due(self, queue: str, limit=100) -> int:
+        return self.__requeue_due(keys=[f"{queue}:retry", queue], args=[time.time(), limit])
+
+    def add_signature(self, url: str, bands: list[str], signature: str) -> list[tuple[str, str]]:
+        """
+        Atomicky si zapamatuje signaturu článku a vrátí [(URL, signatura)] článků, které už mají některé z jeho pásem
+        """
+        candidates = self.__lsh_add(keys=[self.lsh_buckets, self.lsh_signatures], args=[url, signature, *bands])
+        return [(candidate, stored) for candidate, stored in zip(candidates[::2], candidates[1::2]) if stored]
+
+    def remove_signature(self, url: str, bands: list[str]) -> None:
+        self.__lsh_remove(keys=[self.lsh_buckets, self.lsh_signatures], args=[url, *bands])
+
+    def skip_duplicate(self, url: str, duplicate_of: str, similarity: float) -> None:
+        """
+        Článek je téměř stejný jako už uložený - neukládá se, jen se zapíše do seznamu duplicit a URL se potvrdí
+        """
+        pipeline = self.__redis_client.pipeline()
+        pipeline.rpush(self.duplicates, json.dumps({"url": url, "duplicate_of": duplicate_of, "similarity": similarity}))
+        _release_urls(pipeline, self, [url])
+        pipeline.execute()
+
+    def heartbeat(self, queue: str) -> None:
+        """
+        Zaregistruje working_queue workera (a frontu, ze které bere) a obnoví jeho heartbeat
+        """
+        pipeline = self.__redis_client.pipeline()
+        pipeline.hset(self.workers, self.working_queue, queue)
+        pipeline.zadd(self.heartbeats, {self.working_queue: time.time()})
+        pipeline.execute()
 
-    def generate_archive_links(self, start=1, end=40398):
+    def reap(self, visibility_timeout=300, heartbeat_timeout=60, max_retries=5) -> int:
+        """
+        Vrátí do fronty URL mrtvých workerů (bez heartbeatu déle než [heartbeat_timeout]) a URL, které jsou
+        u živého workera déle než [visibility_timeout] sekund. Vrací počet přesunutých URL
+        """
+        now = time.time()
+        workers = self.__redis_client.hgetall(self.workers)
+        heartbeats = dict(self.__redis_client.zrange(self.heartbeats, 0, -1, withscores=True))
+        moved = 0
+
+        for working_queue, queue in workers.items():
+            dead = now - heartbeats.get(working_queue, 0) > heartbeat_timeout
+            if dead:
+                moved += self.requeue_working_queue(working_queue, queue, max_retries)
+            else:
+                moved += self.__reap(keys=[working_queue, queue, self.leases, self.retry_attempts, self.url_errors, self.dead_letter],
+                                     args=[now, max_retries, visibility_timeout])
+            if dead and not self.__redis_client.exists(working_queue):
+                pipeline = self.__redis_client.pipeline()
+                pipeline.hdel(self.workers, working_queue)
+                pipeline.zrem(self.heartbeats, working_queue)
+                pipeline.execute()
+
+        return moved
+
+    def requeue_working_queue(self, working_queue: str, queue: str, max_retries=5) -> int:
+        """
+        Vrátí do [queue] všechno z [working_queue] (mrtvý worker, starý sdílený working_queue) po kusech o DRAIN_CHUNK URL
+        """
+        moved = 0
+        while True:
+            count = self.__drain(keys=[working_queue, queue, self.leases, self.retry_attempts, self.url_errors, self.dead_letter],
+                                 args=[time.time(), max_retries, DRAIN_CHUNK])
+            moved += count
+            if count < DRAIN_CHUNK:
+                return moved
+
+    def generate_archive_links(self, start=1, end=ARCHIVE_PAGES):
         if not self.__redis_client.exists("archive_generated"):
-            links = [f"https://www.idnes.cz/zpravy/archiv/{i}?datum=&idostrova=idnes" for i in range(start, end+1)]
+            links = [ARCHIVE_URL.format(i) for i in range(start, end+1)]
             self.__redis_client.rpush(self.archive_queue, *links)
             self.__redis_client.set("archive_generated", "ok")
 
     def close(self) -> None:
         self.__redis_client.close()
+        if self.__binary_client is not None:
+            self.__binary_client.close()
 
     def clear(self) -> None:
-        self.__redis_client.delete(*[self.working_queue, self.archive_queue, self.article_list, self.articles_queue, self.urls_list, self.error_list, "archive_generated"])
+        worker_queues = list(self.__redis_client.scan_iter(f"{self.working_queue_prefix}:*"))
+        worker_queues += list(self.__redis_client.scan_iter(self.frontier.key_pattern))
+        self.__redis_client.delete(*[self.working_queue_prefix, self.archive_queue, self.article_list, self.articles_queue, self.urls_list, self.error_list, "archive_generated",
+                                     self.retry_attempts, f"{self.archive_queue}:retry", f"{self.articles_queue}:retry", *worker_queues,
+                                     self.url_errors, self.dead_letter, self.leases, self.workers, self.heartbeats,
+                                     self.lsh_buckets, self.lsh_signatures, self.duplicates, self.dictionaries])
 
     def dump_articles(self, batch_size = 10000, output_file="idnes_articles_data.json"):
-        list_length = self.__redis_client.llen(self.article_list)
-
-        articles = []
         # Batch size, protože při velikosti dat například 1 GB už může být problém s přenosem dat.
-        for i in range(0, list_length, batch_size):
-            print(f"Batch {i}")
-            batch = self.__redis_client.lrange(self.article_list, i, i + batch_size - 1)
-            for article in batch:
-                json_object = json.loads(article)
-                articles.append(json_object)
-
+        # Články se do JSON pole zapisují tak, jak jsou uložené v Redisu, takže v paměti je jen jedna dávka
         with open(output_file, 'w', encoding="utf-8") as file:
-            json.dump(articles, file, indent=4, ensure_ascii=False)
+            file.write("[")
+            separator = "\n"
+            for i, batch in enumerate(self.iter_article_batches(batch_size=batch_size)):
+                logger.info(f"Batch {i * batch_size}")
+                file.write(separator + ",\n".join(batch))
+                separator = ",\n"
+            file.write("\n]")
+
+    def count_articles(self) -> int:
+        return self.__redis_client.llen(self.article_list)
+
+    def iter_article_batches(self, start=0, end=None, batch_size=10000):
+        """
+        Vrací články [start, end) po dávkách jako JSON řetězce - JSON záznamy tak, jak jsou uložené v Redisu,
+        binární záznamy se převedou přes codec
+        """
+        end = self.count_articles() if end is None else end
+        for i in range(start, end, batch_size):
+            yield [self.codec.to_json(raw) for raw in self.__binary().lrange(self.article_list, i, min(i + batch_size, end) - 1)]
+
+    def dump_articles_ndjson(self, output_file="idnes_articles_data.ndjson", batch_size=10000, compression=None, shards=1, shard=None, resume=True) -> list[str]:
+        """
+        Streamovaný export do NDJSON (volitelně gzip/zstd a rozdělený do [shards] souborů), paměť drží jen jednu dávku.
+        Přerušený export při dalším spuštění naváže, viz article_export
+        """
+        return export_ndjson(self, output_file, batch_size, compression, shards=shards, shard=shard, resume=resume)
+
+    def dump_articles_parquet(self, output_dir="idnes_articles.parquet", batch_size=10000, row_group_size=50000, compression="zstd") -> int:
+        """
+        Export do Parquet datasetu s typovanými sloupci rozděleného podle roku publikace, viz parquet_export
+        """
+        # pyarrow je potřeba jen pro tenhle export, scraper bez něj běží
+        from parquet_export import export_parquet
+        return export_parquet(self.iter_article_batches(batch_size=batch_size), output_dir, row_group_size, compression)
+
+    def migrate_urls(self, batch_size=4096) -> int:
+        """
+        Převede starou množinu celých URL (data_idnes_urls) do frontieru bez zařazení do fronty a smaže ji.
+        Scraper ji volá při startu, bez staré množiny je to jen jeden EXISTS. Vrací počet převedených URL
+        """
+        if self.frontier.mode == "set" or not self.__redis_client.exists(self.urls_list):
+            return 0
+        migrated = 0
+        batch = []
+        for url in self.__redis_client.sscan_iter(self.urls_list, count=batch_size):
+            batch.append(url)
+            if len(batch) >= batch_size:
+                migrated += self.__mark_seen_batch(batch)
+                batch = []
+        migrated += self.__mark_seen_batch(batch)
+        self.__redis_client.delete(self.urls_list)
+        return migrated
+
+    def __mark_seen_batch(self, urls: list[str]) -> int:
+        script_args = self.frontier.script_args(self.articles_queue, urls, enqueue=False)
+        if script_args is None:
+            return 0
+        keys, args = script_args
+        self.__mark_seen(keys=keys, args=args)
+        return len(urls)
+
+    def pending_urls(self) -> list[str]:
+        """
+        URL článků, které ještě nejsou vyscrapované - articles_queue, její retry zset a working_queue workerů nad ní
+        """
+        working_queues = [working_queue for working_queue, queue in self.__redis_client.hgetall(self.workers).items() if queue == self.articles_queue]
+        pipeline = self.__redis_client.pipeline(transaction=False)
+        pipeline.lrange(self.articles_queue, 0, -1)
+        pipeline.zrange(f"{self.articles_queue}:retry", 0, -1)
+        for working_queue in working_queues:
+            pipeline.lrange(working_queue, 0, -1)
+        return list(dict.fromkeys(url for urls in pipeline.execute() for url in urls))
 
     def dump_urls(self,output_file="idnes_urls_data.txt") -> None:
-        urls = self.__redis_client.smembers(self.urls_list)
+        if self.frontier.mode == "set":
+            urls = self.__redis_client.smembers(self.urls_list)
+        else:
+            # Hashe ani Bloom filtr zpět na URL převést nejdou, vypíšou se aspoň URL, které čekají na scrapování
+            logger.warning(f"Frontier '{self.frontier.mode}' keeps only URL hashes, dumping only pending urls")
+            urls = self.pending_urls()
         with open(output_file, 'w', encoding="utf-8") as file:
             file.write('\n'.join(urls))
 
+
+class AsyncDataStore:
+    """
+    Asynchronní varianta DataStore pro asyncio runner. Všechny korutiny sdílí jeden connection pool, každé čekající
+    BRPOPLPUSH v něm ale drží vlastní spojení - N korutin tak znamená zhruba N spojení do Redisu (+ flusher).
+    Pool je blokující, korutina nad [max_connections] počká na volné spojení (výchozí pool by vyhodil
+    MaxConnectionsError a shodil celý runner). Runner proto nastavuje max_connections podle počtu korutin.
+    """
+    def __init__(self, host = "localhost", password="", port=6378, working_queue="working_queue", error_list="error_list", article_list = "data_idnes_articles", urls_list = "data_idnes_urls", articles_queue = "articles_queue", archive_queue="archive_queue", retry_attempts="url_attempts", worker_id=None, url_errors="url_errors", dead_letter="dead_letter", leases="url_leases", workers="scraper_workers", heartbeats="scraper_heartbeats",
+                 lsh_buckets="lsh_buckets", lsh_signatures="lsh_signatures", duplicates="duplicate_articles", frontier="hash", codec: ArticleCodec = None, max_connections=None, metrics: Metrics = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.worker_id = worker_id
+        self.working_queue_prefix = working_queue
+        self.working_queue = f"{working_queue}:{worker_id}" if worker_id else working_queue
+        self.error_list = error_list
+        self.article_list = article_list
+        self.urls_list = urls_list
+        self.articles_queue = articles_queue
+        self.archive_queue = archive_queue
+        self.retry_attempts = retry_attempts
+        self.url_errors = url_errors
+        self.dead_letter = dead_letter
+        self.leases = leases
+        self.workers = workers
+        self.heartbeats = heartbeats
+        self.lsh_buckets = lsh_buckets
+        self.lsh_signatures = lsh_signatures
+        self.duplicates = duplicates
+        self.frontier = UrlFrontier(urls_list, mode=frontier)
+        # Codec se slovníkem načítá synchronní DataStore.create_codec
+        self.codec = codec or ArticleCodec()
+        self.metrics = metrics or Metrics()
+        pool = redis.asyncio.BlockingConnectionPool(host=self.host, port=self.port, password=self.password, decode_responses=True, max_connections=max_connections or 50, timeout=None)
+        self.__redis_client = redis.asyncio.Redis.from_pool(pool)
+        self.__token_bucket = self.__redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.__requeue_due = self.__redis_client.register_script(REQUEUE_DUE_SCRIPT)
+        self.__mark_seen = self.__redis_client.register_script(self.frontier.script)
+
+    async def save_article(self, article) -> int:
+        return await self.__redis_client.rpush(self.article_list, self.codec.encode(article))
+
+    async def save_urls(self, urls: list[str]) -> int:
+        script_args = self.frontier.script_args(self.articles_queue, urls)
+        if script_args is None:
+            return 0
+        keys, args = script_args
+        with self.metrics.timer("save_urls"):
+            added = await self.__mark_seen(keys=keys, args=args)
+        self.metrics.inc("urls_new", added)
+        return added
+
+    async def get_url_to_scrape(self, queue: str, timeout=10) -> str:
+        """
+        [queue] = {articles_queue, archive_queue}
+        """
+        return await self.__redis_client.brpoplpush(queue, self.working_queue, timeout)
+
+    async def ack_scrape(self, url: str):
+        await self.ack_scrape_batch([url])
+
+    async def ack_scrape_batch(self, urls: list[str]):
+        if not urls:
+            return
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            _release_urls(pipeline, self, urls)
+            with self.metrics.timer("ack_scrape"):
+                await pipeline.execute()
+
+    async def save_and_ack(self, items: list[tuple[str, dict]]) -> None:
+        if not items:
+            return
+        async with self.__redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.rpush(self.article_list, *[self.codec.encode(article) for _, article in items])
+            _release_urls(pipeline, self, [url for url, _ in items])
+            with self.metrics.timer("save_article"):
+                await pipeline.execute()
+        self.metrics.inc("articles_saved", len(items))
+
+    async def save_urls_and_ack(self, pages: list[tuple[str, list[str]]]) -> None:
+        if not pages:
+            return
+        await self.save_urls([url for _, urls in pages for url in urls])
+        await self.ack_scrape_batch([url for url, _ in pages])
+
+    async def log_error(self, message: str) -> None:
+        await self.__redis_client.rpush(self.error_list, message)
+        logger.warning(message)
+
+    async def take_token(self, key: str, rate: float, capacity: int) -> int:
+        return int(await self.__token_bucket(keys=[key], args=[rate, capacity]))
+
+    async def register_failure(self, url: str, error: str = "") -> int:
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.hincrby(self.retry_attempts, url, 1)
+            pipeline.hset(self.url_errors, url, error)
+            return (await pipeline.execute())[0]
+
+    async def schedule_retry(self, url: str, queue: str, delay: float) -> None:
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.zadd(f"{queue}:retry", {url: time.time() + delay})
+            _release_urls(pipeline, self, [url], forget_attempts=False)
+            await pipeline.execute()
+
+    async def move_to_dead_letter(self, url: str, queue: str, error: str, attempts: int) -> None:
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.rpush(self.dead_letter, _dead_letter_entry(url, queue, error, attempts))
+            _release_urls(pipeline, self, [url])
+            await pipeline.execute()
+
+    async def skip_duplicate(self, url: str, duplicate_of: str, similarity: float) -> None:
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.rpush(self.duplicates, json.dumps({"url": url, "duplicate_of": duplicate_of, "similarity": similarity}))
+            _release_urls(pipeline, self, [url])
+            await pipeline.execute()
+
+    async def heartbeat(self, queue: str) -> None:
+        async with self.__redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.hset(self.workers, self.working_queue, queue)
+            pipeline.zadd(self.heartbeats, {self.working_queue: time.time()})
+            await pipeline.execute()
+
+    async def requeue_due(self, queue: str, limit=100) -> int:
+        return await self.__requeue_due(keys=[f"{queue}:retry", queue], args=[time.time(), limit])
+
+    async def close(self) -> None:
+        await self.__redis_client.aclose()
+
+
+
+class BatchWriter:
+    """
+    Dávkový zápis výsledků - uložení i potvrzení N stránek jde do Redisu jednou transakcí místo
+    RPUSH + LREM + HDEL za každý článek. Flush nastane po [max_items] kusech nebo [max_delay_ms]
+    od přidání prvního nezapsaného kusu. Dokud dávka není zapsaná, URL zůstávají ve working_queue
+    workera, takže se při pádu neztratí.
+    """
+    def __init__(self, store: DataStore, max_items=100, max_delay_ms=500):
+        self.store = store
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000
+        self.__articles = []
+        self.__archive_pages = []
+        self.__first_added = None
+
+    @property
+    def pending(self) -> int:
+        return len(self.__articles) + len(self.__archive_pages)
+
+    def add_article(self, url: str, article: dict) -> None:
+        self.__articles.append((url, article))
+        self.__added()
+
+    def add_archive_page(self, url: str, urls: list[str]) -> None:
+        self.__archive_pages.append((url, urls))
+        self.__added()
+
+    def __added(self) -> None:
+        if self.__first_added is None:
+            self.__first_added = time.monotonic()
+        if self.pending >= self.max_items:
+            self.flush()
+
+    def flush_if_due(self) -> None:
+        if self.__first_added is not None and time.monotonic() - self.__first_added >= self.max_delay:
+            self.flush()
+
+    def flush(self) -> None:
+        articles, archive_pages = self.__articles, self.__archive_pages
+        self.__articles, self.__archive_pages, self.__first_added = [], [], None
+
+        self.store.save_urls_and_ack(archive_pages)
+        self.store.save_and_ack(articles)
+
+
+class AsyncBatchWriter:
+    """
+    BatchWriter pro AsyncDataStore, jeden na celý event loop. Flush podle času zajišťuje korutina run_flusher
+    """
+    def __init__(self, store: AsyncDataStore, max_items=100, max_delay_ms=500):
+        self.store = store
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000
+        self.__articles = []
+        self.__archive_pages = []
+
+    @property
+    def pending(self) -> int:
+        return len(self.__articles) + len(self.__archive_pages)
+
+    async def add_article(self, url: str, article: dict) -> None:
+        self.__articles.append((url, article))
+        if self.pending >= self.max_items:
+            await self.flush()
+
+    async def add_archive_page(self, url: str, urls: list[str]) -> None:
+        self.__archive_pages.append((url, urls))
+        if self.pending >= self.max_items:
+            await self.flush()
+
+    async def flush(self) -> None:
+        articles, archive_pages = self.__articles, self.__archive_pages
+        self.__articles, self.__archive_pages = [], []
+
+        await self.store.save_urls_and_ack(archive_pages)
+        await self.store.save_and_ack(articles)
+
+    async def run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.max_delay)
+            try:
+                await self.flush()
+            except Exception as e:
+                await self.store.log_error(f"[writer] Couldn't save batch with error {str(e)}")
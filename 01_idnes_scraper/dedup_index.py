@@ -0,0 +1,39 @@
+import os
+import sys
+import numpy as np
+
+# MinHash/LSH je sdílený s analýzou dat, aby signatury ze scraperu i z analýzy byly porovnatelné
+ANALYSIS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data"))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_DIR)
+from dedup import MinHasher
+
+
+class DedupIndex:
+    """
+    Streamovaná deduplikace při scrapování. Pásma MinHash signatur všech uložených článků jsou v Redisu
+    (hash lsh_buckets: "<pásmo>:<hash>" -> URL), signatury v lsh_signatures. Nový článek se stejným pásmem
+    se porovná s kandidáty a když je podobnost >= threshold, neuloží se.
+    Paměť Redisu: bands + 1 položek na článek, pro 1.4M článků a 8 pásem zhruba 1-2 GB
+    [store] - DataStore sdílený mezi vlákny
+    """
+    def __init__(self, store, hasher: MinHasher):
+        self.store = store
+        self.hasher = hasher
+
+    def check_and_add(self, url: str, article: dict) -> tuple[str, float] | None:
+        """
+        Vrátí (URL původního článku, podobnost), když je článek duplicita, jinak si ho zapamatuje a vrátí None
+        """
+        signature = self.hasher.signature(article["article_content"])
+        if signature is None:
+            return None
+
+        bands = [f"{band}:{value:016x}" for band, value in enumerate(self.hasher.band_hashes(signature[None, :])[0].tolist())]
+        # Zápis a výběr kandidátů je jeden skript, souběžně zpracovávaná kopie článku tak neproklouzne
+        for candidate, stored in self.store.add_signature(url, bands, signature.tobytes().hex()):
+            similarity = float(self.hasher.similarity(np.frombuffer(bytes.fromhex(stored), dtype=np.uint32), signature))
+            if similarity >= self.hasher.threshold:
+                self.store.remove_signature(url, bands)
+                return candidate, similarity
+        return None
@@ -0,0 +1,143 @@
+import hashlib
+import posixpath
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Frontier - kanonizace URL a deduplikace už viděných adres jedním voláním skriptu v Redisu na dávku.
+# Místo množiny celých URL (data_idnes_urls, ~150 B na URL) se drží jen 64bitové hashe rozdělené do
+# [buckets] malých množin. Malá množina celých čísel je v Redisu intset (8 B na položku), dokud nepřeroste
+# set-max-intset-entries (výchozí 512), takže pro 1.4M URL je to ~11 MB + pevných ~1.5 MB na klíče bucketů.
+# S RedisBloom (redis-stack) lze místo hashů použít Bloom filtr (~1.8 B na URL pro chybovost 0.1 %).
+
+# Parametry, které nemění obsah stránky - sledování kampaní a odkud čtenář přišel
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "zdroj", "ref", "recommendation_id", "xtor"}
+TRACKING_PREFIXES = ("utm_",)
+
+BASE_URL = "https://www.idnes.cz/"
+
+FRONTIER_MODES = ("hash", "bloom", "set")
+
+# unpack v Lua Redisu zvládne jen ~8000 hodnot (LUAI_MAXCSTACK), RPUSH a BF.MADD se proto volají po kusech
+UNPACK_CHUNK = 4096
+
+# KEYS[1] = fronta, KEYS[2..n+1] = množina pro každou URL, ARGV[1] = '1' když se nové URL mají zařadit do fronty,
+# ARGV[2..n+1] = členové množin (hash nebo celá URL), ARGV[n+2..2n+1] = URL. Vrací počet nových URL
+SEEN_SET_SCRIPT = f"""
+local n = #KEYS - 1
+local new = {{}}
+for i = 1, n do
+    if redis.call('SADD', KEYS[i + 1], ARGV[i + 1]) == 1 then
+        new[#new + 1] = ARGV[n + i + 1]
+    end
+end
+if ARGV[1] == '1' then
+    for i = 1, #new, {UNPACK_CHUNK} do
+        redis.call('RPUSH', KEYS[1], unpack(new, i, math.min(i + {UNPACK_CHUNK} - 1, #new)))
+    end
+end
+return #new
+"""
+
+# KEYS[1] = fronta, KEYS[2] = Bloom filtr, ARGV[1] = zařadit do fronty, ARGV[2], ARGV[3] = kapacita a chybovost
+# filtru při jeho založení, ARGV[4..n+3] = hashe, ARGV[n+4..2n+3] = URL
+SEEN_BLOOM_SCRIPT = f"""
+local n = (#ARGV - 3) / 2
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    redis.call('BF.RESERVE', KEYS[2], ARGV[3], ARGV[2])
+end
+local new = {{}}
+for first = 1, n, {UNPACK_CHUNK} do
+    local last = math.min(first + {UNPACK_CHUNK} - 1, n)
+    local added = redis.call('BF.MADD', KEYS[2], unpack(ARGV, first + 3, last + 3))
+    for i = first, last do
+        if added[i - first + 1] == 1 then
+            new[#new + 1] = ARGV[n + i + 3]
+        end
+    end
+end
+if ARGV[1] == '1' then
+    for i = 1, #new, {UNPACK_CHUNK} do
+        redis.call('RPUSH', KEYS[1], unpack(new, i, math.min(i + {UNPACK_CHUNK} - 1, #new)))
+    end
+end
+return #new
+"""
+
+
+def canonicalize_url(url: str, base=BASE_URL) -> str:
+    """
+    Kanonický tvar URL, aby se stejný článek nescrapoval víckrát: absolutní https adresa s malým hostem,
+    bez fragmentu, sledovacích parametrů, lomítka na konci a bez /foto (galerie článku je stejný článek)
+    """
+    parts = urlsplit(urljoin(base, url.strip()))
+    # iDNES běží jen na https
+    scheme = "https" if parts.scheme in ("http", "https") else parts.scheme
+    host = parts.hostname or ""
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = posixpath.normpath(parts.path) if parts.path not in ("", "/") else "/"
+    while path.endswith("/foto"):
+        path = path[:-len("/foto")]
+    path = path or "/"
+
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_hash(url: str) -> int:
+    """
+    64bitový hash URL jako znaménkové číslo - Redis ho v množině uloží jako celé číslo (intset)
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+class UrlFrontier:
+    """
+    Připraví klíče a argumenty skriptu, který v jednom EVALSHA označí dávku URL jako viděné a nové zařadí do fronty.
+    Samotné skripty registruje DataStore/AsyncDataStore, frontier je tak společný pro sync i asyncio klienta
+    [mode] = {hash, bloom, set} - set je původní množina celých URL v [seen_key] (jde vypsat přes dump_urls)
+    [buckets] - počet množin hashů, musí být stejný pro všechny scrapery nad jedním Redisem
+    """
+    def __init__(self, seen_key="data_idnes_urls", mode="hash", buckets=16384, bloom_capacity=5_000_000, bloom_error_rate=0.001):
+        if mode not in FRONTIER_MODES:
+            raise ValueError(f"Unknown frontier mode: {mode}")
+        self.seen_key = seen_key
+        self.mode = mode
+        self.buckets = buckets
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_key = f"{seen_key}:bloom"
+
+    @property
+    def script(self) -> str:
+        return SEEN_BLOOM_SCRIPT if self.mode == "bloom" else SEEN_SET_SCRIPT
+
+    @property
+    def key_pattern(self) -> str:
+        """
+        Vzor klíčů bucketů a Bloom filtru (pro smazání)
+        """
+        return f"{self.seen_key}:*"
+
+    def bucket_key(self, hashed: int) -> str:
+        return f"{self.seen_key}:{hashed % self.buckets:x}"
+
+    def script_args(self, queue: str, urls: list[str], enqueue=True) -> tuple[list[str], list] | None:
+        """
+        Vrátí (KEYS, ARGV) pro skript, None pro prázdnou dávku. URL se kanonizují a deduplikují už tady
+        """
+        urls = list(dict.fromkeys(canonicalize_url(url) for url in urls if url))
+        if not urls:
+            return None
+        flag = "1" if enqueue else "0"
+
+        if self.mode == "set":
+            return [queue, *[self.seen_key] * len(urls)], [flag, *urls, *urls]
+
+        hashes = [url_hash(url) for url in urls]
+        if self.mode == "bloom":
+            return [queue, self.bloom_key], [flag, self.bloom_capacity, self.bloom_error_rate, *hashes, *urls]
+        return [queue, *[self.bucket_key(hashed) for hashed in hashes]], [flag, *hashes, *urls]
@@ -0,0 +1,137 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from time import time
+
+
+class HtmlCache:
+    """
+    Cache stažených stránek na disku, aby šlo po opravě parseru všechno přeparsovat bez sítě.
+    Těla jsou uložená content-addressed podle sha256 obsahu (gzip) v objects/, takže stejná stránka
+    zabere místo jen jednou. Metadata URL (ETag, Last-Modified, hash těla, čas stažení) jsou v urls/.
+    [root] - adresář cache
+    """
+    def __init__(self, root: str, compress_level=6):
+        self.root = root
+        self.compress_level = compress_level
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "urls"), exist_ok=True)
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.gz")
+
+    def _metadata_path(self, url: str) -> str:
+        digest = self._digest(url.encode())
+        return os.path.join(self.root, "urls", digest[:2], f"{digest}.json")
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        # Zápis přes dočasný soubor, aby pád uprostřed zápisu nenechal v cache useknutý soubor. Jméno dočasného
+        # souboru je unikátní, do stejné cesty můžou zapisovat vlákna jednoho procesu (stejná URL, put a touch)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get_metadata(self, url: str) -> dict | None:
+        try:
+            with open(self._metadata_path(url), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def get(self, url: str) -> bytes | None:
+        metadata = self.get_metadata(url)
+        if metadata is None:
+            return None
+        return read_object(self._object_path(metadata["sha256"]))
+
+    def put(self, url: str, content: bytes, headers=None) -> dict:
+        """
+        Uloží tělo odpovědi a metadata k URL, vrací metadata
+        """
+        headers = headers or {}
+        digest = self._digest(content)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write_atomic(object_path, gzip.compress(content, self.compress_level))
+
+        metadata = {
+            "url": url,
+            "kind": "archive" if "/archiv/" in url else "article",
+            "sha256": digest,
+            "size": len(content),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time(),
+        }
+        self._write_atomic(self._metadata_path(url), json.dumps(metadata).encode())
+        return metadata
+
+    def touch(self, url: str) -> None:
+        """
+        Stránka se nezměnila (304) - jen posuneme čas posledního ověření
+        """
+        metadata = self.get_metadata(url)
+        if metadata is not None:
+            metadata["fetched_at"] = time()
+            self._write_atomic(self._metadata_path(url), json.dumps(metadata).encode())
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """
+        Hlavičky pro podmíněný GET - když se stránka nezměnila, server vrátí 304 bez těla
+        """
+        metadata = self.get_metadata(url)
+        headers = {}
+        if metadata is None:
+            return headers
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def iter_metadata(self, kind=None):
+        """
+        Projde metadata všech URL v cache
+        [kind] = {None, article, archive}
+        """
+        urls_dir = os.path.join(self.root, "urls")
+        for bucket in os.scandir(urls_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                with open(entry.path, "r", encoding="utf-8") as file:
+                    metadata = json.load(file)
+                if kind is None or metadata["kind"] == kind:
+                    yield metadata
+
+    def iter_object_paths(self, kind=None):
+        for metadata in self.iter_metadata(kind):
+            yield metadata["url"], self._object_path(metadata["sha256"])
+
+
+def read_object(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return gzip.decompress(file.read())
+
+
+def parse_cached(parse, path: str):
+    """
+    Načte stránku z cache a rovnou ji rozparsuje - volá se v ProcessPoolExecutoru, takže se mezi procesy posílá jen cesta
+    """
+    return parse(read_object(path))
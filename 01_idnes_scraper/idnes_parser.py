@@ -94,4 +94,18 @@ def parse_archive_page(content: bytes) -> list[str]:
     """
     soup = BeautifulSoup(content, 'html.parser')
     return [link.get('href') for link in soup.find_all(
-        "a", {"class": "art-link"}) if link.get('href')]
\ No newline at end of file
+        "a", {"class": "art-link"}) if link.get('href')]
+
+
+def get_parser(backend="bs4"):
+    """
+    Vrátí dvojici (parse_article, parse_archive_page) pro zvolený backend, obě varianty vrací stejné mapy
+    [backend] = {bs4, lxml}
+    """
+    if backend == "bs4":
+        return parse_article, parse_archive_page
+    if backend == "lxml":
+        import idnes_parser_lxml
+        return idnes_parser_lxml.parse_article, idnes_parser_lxml.parse_archive_page
+
+    raise ValueError(f"Unknown parser backend: {backend}")
@@ -0,0 +1,141 @@
+import re
+import threading
+from lxml import etree, html
+
+# Rychlá varianta idnes_parser nad lxml (libxml2). Vrací stejné mapy jako BeautifulSoup verze,
+# ale strom se staví v C a všechny dotazy jsou předkompilované XPath výrazy.
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+_ARTICLE_NAME = etree.XPath('//h1[@itemprop="name headline"]')
+_ARTICLE_OPENER = etree.XPath(f'//div[{_has_class("opener")}]')
+_CONTENT_PARAGRAPHS = etree.XPath('(//div[@id="art-text"])[1]//p')
+_COMMENT_COUNT = etree.XPath('(//a[@id="moot-linkin"])[1]//span')
+_PUBLISHED_TIME = etree.XPath('//meta[@property="article:published_time"]')
+_AUTHOR = etree.XPath('//meta[@property="article:author"]')
+_GALLERY = etree.XPath(f'//*[{_has_class("more-gallery")}]')
+_OPENER_FOTO_COUNT = etree.XPath(f'count(//*[{_has_class("opener-foto")}])')
+_KEYWORDS = etree.XPath('//meta[@name="keywords"][@lang="cs"]')
+_UNIDATA_SCRIPT = etree.XPath('//script[contains(., "var Unidata = {")]')
+_ARCHIVE_LINKS = etree.XPath(f'//a[{_has_class("art-link")}]/@href')
+
+_SECTION_RE = re.compile(r'"section": "(.*?)",')
+_SUBSECTION_RE = re.compile(r'"subSection": "(.*?)",')
+_ARTICLE_TYPE_RE = re.compile(r'"articleType": "(.*?)",')
+_NUMBER_RE = re.compile(r"\d+")
+
+# libxml2 normalizuje \r\n na \n, html.parser ne. Aby výstup seděl 1:1 s BeautifulSoup verzí,
+# schováme \r před parsováním za znak z privátní oblasti Unicode a ve výsledných řetězcích ho vrátíme.
+_CR_PLACEHOLDER = "\ue000"
+
+_local = threading.local()
+
+
+def _parser() -> html.HTMLParser:
+    # Instance parseru nesdílíme mezi vlákny
+    if not hasattr(_local, "parser"):
+        _local.parser = html.HTMLParser(encoding="utf-8")
+    return _local.parser
+
+
+def _document(content: bytes):
+    return html.document_fromstring(content.replace(b"\r", _CR_PLACEHOLDER.encode()), parser=_parser())
+
+
+def _restore(value):
+    return value.replace(_CR_PLACEHOLDER, "\r") if value is not None else None
+
+
+def _first(elements):
+    return elements[0] if elements else None
+
+
+def _string(element):
+    """
+    Obdoba BeautifulSoup `.string` - text vrátí jen tehdy, když má element právě jednoho potomka
+    (text, komentář nebo element s jedním potomkem), jinak None
+    """
+    while True:
+        if len(element) == 0:
+            return _restore(element.text) if element.text else None
+        if element.text or len(element) > 1 or element[0].tail:
+            return None
+        element = element[0]
+        if not isinstance(element.tag, str):
+            return _restore(element.text)
+
+
+def _split_meta(element) -> list[str]:
+    value = _restore(element.attrib["content"])
+    return value.split(', ') if ',' in value else [value]
+
+
+def parse_article(content: bytes) -> dict[str, any]:
+    """
+    Metoda vyextrahuje důležité informace o článku a vrátí je jako mapu (stejnou jako idnes_parser.parse_article)
+    [content] - response.content z requestu jako byty
+    """
+    document = _document(content)
+
+    article_name_elem = _first(_ARTICLE_NAME(document))
+    article_opener_elem = _first(_ARTICLE_OPENER(document))
+
+    # Když div#art-text chybí, XPath nevrátí žádné odstavce a obsah je prázdný
+    article_content = ''.join([text for text in map(_string, _CONTENT_PARAGRAPHS(document)) if text is not None])
+
+    # Počet komentářů
+    comment_count_raw = _first(_COMMENT_COUNT(document))
+    article_comment_count = int(_NUMBER_RE.search(_string(comment_count_raw)).group()) if comment_count_raw is not None else 0
+
+    # Meta tagy
+    article_published_time = _first(_PUBLISHED_TIME(document))
+    article_author_tag = _first(_AUTHOR(document))
+    article_author = _split_meta(article_author_tag) if article_author_tag is not None else []
+
+    # Galerie
+    article_image_count = 0
+    gallery_raw = _first(_GALLERY(document))
+    if gallery_raw is not None:
+        article_image_count = int(_NUMBER_RE.search(gallery_raw.text_content()).group())
+
+    # Když je na stránce jedna fotka, tak není v more-gallery, takže ji musíme přičíst
+    article_image_count += int(_OPENER_FOTO_COUNT(document))
+
+    # Témata
+    meta_keywords = _first(_KEYWORDS(document))
+    article_keywords = _split_meta(meta_keywords) if meta_keywords is not None else []
+
+    # Script tag s Unidata - sekce, podsekce a jestli je to premium
+    javascript_code = _restore(_first(_UNIDATA_SCRIPT(document)).text)
+    section_match = _SECTION_RE.search(javascript_code)
+    subsection_match = _SUBSECTION_RE.search(javascript_code)
+    article_type_match = _ARTICLE_TYPE_RE.search(javascript_code)
+
+    section = section_match.group(1) if section_match else None
+    subsection = subsection_match.group(1) if subsection_match else None
+    article_type = article_type_match.group(1) if article_type_match else None
+
+    article_category = f"{section} > {subsection}" if section and subsection else section or subsection
+    article_is_premium = article_type == "premium"
+
+    return {
+        "article_name": _string(article_name_elem) if article_name_elem is not None else "",
+        "article_opener": _string(article_opener_elem) if article_opener_elem is not None else "",
+        "article_published_time": _restore(article_published_time.attrib["content"]) if article_published_time is not None else "",
+        "article_comment_count": article_comment_count,
+        "article_content": article_content,
+        "article_image_count": article_image_count,
+        "article_author": article_author,
+        "article_keywords": article_keywords,
+        "article_category": article_category,
+        "article_is_premium": article_is_premium
+    }
+
+
+def parse_archive_page(content: bytes) -> list[str]:
+    """
+    Metoda vyextrahuje veškere linky z archívu a vrátí je
+    [content] - response.content z requestu jako byty
+    """
+    return [_restore(href) for href in _ARCHIVE_LINKS(_document(content)) if href]
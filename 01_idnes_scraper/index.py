@@ -1,107 +1,615 @@
 import requests
 import os
+import logging
+import socket
+import asyncio
+import aiohttp
+import queue
+import multiprocessing
 import concurrent.futures
-from data_store import DataStore
-from idnes_parser import parse_article, parse_archive_page
+from concurrent.futures.process import BrokenProcessPool
+from data_store import DataStore, AsyncDataStore, BatchWriter, AsyncBatchWriter, ARCHIVE_URL, ARCHIVE_PAGES
+from idnes_parser import get_parser
+from rate_limiter import RateLimiter, AsyncRateLimiter, RetryableError, backoff_delay, retry_after_seconds
+from html_cache import HtmlCache, parse_cached
+from frontier import canonicalize_url
+from metrics import Metrics, timed_call, run_stats_reporter, serve_metrics
 import threading
 from enum import Enum
-from time import sleep
+from time import monotonic, sleep
+from functools import partial
+from itertools import islice
+
+logger = logging.getLogger("scraper")
+
+# Spojení do Redisu navíc k jednomu na korutinu v asyncio runneru
+ASYNC_REDIS_SPARE_CONNECTIONS = 4
 
 class ScraperMode(Enum): 
     SCRAPE_ARCHIVE_URLS = 1
     SCRAPE_ARTICLES = 2
+    REPARSE_CACHE = 3
+    REFRESH_ARCHIVE = 4
 
 class IdnesScraper:
 
-    def __init__(self, redis_host='localhost', redis_port=6379, num_of_threads=5, mode: ScraperMode = ScraperMode.SCRAPE_ARTICLES, redis_pass=""):
+    def __init__(self, redis_host='localhost', redis_port=6379, num_of_threads=5, mode: ScraperMode = ScraperMode.SCRAPE_ARTICLES, redis_pass="", concurrency=100, rate_limit=20.0, rate_burst=40, max_backoff=60.0, parser_backend="bs4",
+                 pipeline_processes=None, pipeline_queue_size=1000, write_batch_size=100, write_batch_ms=500, cache_dir=None,
+                 max_retries=5, visibility_timeout=300, heartbeat_timeout=60, dedup_threshold=0.0, frontier="hash", refresh_stop_pages=3, article_codec="json",
+                 log_level="INFO", stats_interval=10.0, metrics_port=0):
+        # LOG_LEVEL=DEBUG vypisuje i každou scrapovanou URL
+        logging.basicConfig(level=os.getenv('LOG_LEVEL', log_level).upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+        # Metriky - řádek se statistikami každých STATS_INTERVAL sekund (0 = vypnuto), METRICS_PORT pro /metrics
+        self.metrics = Metrics()
+        self.stats_interval = float(os.getenv('STATS_INTERVAL', stats_interval))
+        self.metrics_port = int(os.getenv('METRICS_PORT', metrics_port))
         self.redis_host = os.getenv('REDIS_HOST', redis_host)
         self.redis_port = int(os.getenv('REDIS_PORT', redis_port))
         self.redis_pass = os.getenv('REDIS_PASS',redis_pass)
         self.num_of_threads = int(os.getenv('NUM_OF_THREADS', num_of_threads))
+        self.concurrency = int(os.getenv('CONCURRENCY', concurrency))
         self.mode = ScraperMode(int(os.environ.get('SCRAPER_MODE', mode.value)))
-        self.store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass)
+        # Globální rozpočet requestů/s na host sdílený všemi procesy přes Redis
+        self.rate_limit = float(os.getenv('RATE_LIMIT', rate_limit))
+        self.rate_burst = int(os.getenv('RATE_BURST', rate_burst))
+        self.max_backoff = float(os.getenv('MAX_BACKOFF', max_backoff))
+        self.parser_backend = os.getenv('PARSER_BACKEND', parser_backend)
+        self.parse_article, self.parse_archive_page = get_parser(self.parser_backend)
+        # Pipeline režim - počet parsovacích procesů, velikost fronty raw odpovědí a dávkování zápisů
+        self.pipeline_processes = int(os.getenv('PIPELINE_PROCESSES', pipeline_processes or os.cpu_count()))
+        self.pipeline_queue_size = int(os.getenv('PIPELINE_QUEUE_SIZE', pipeline_queue_size))
+        self.write_batch_size = int(os.getenv('WRITE_BATCH_SIZE', write_batch_size))
+        self.write_batch_ms = int(os.getenv('WRITE_BATCH_MS', write_batch_ms))
+        # Volitelná cache raw odpovědí na disku (reparse bez sítě, podmíněné GETy)
+        self.cache_dir = os.getenv('HTML_CACHE_DIR', cache_dir)
+        self.cache = HtmlCache(self.cache_dir) if self.cache_dir else None
+        # Spolehlivá fronta - po kolika pokusech jde URL do dead letter, jak dlouho smí být URL u workera
+        # a po jak dlouhé době bez heartbeatu bereme workera za mrtvého
+        self.max_retries = int(os.getenv('MAX_RETRIES', max_retries))
+        self.visibility_timeout = float(os.getenv('VISIBILITY_TIMEOUT', visibility_timeout))
+        self.heartbeat_timeout = float(os.getenv('HEARTBEAT_TIMEOUT', heartbeat_timeout))
+        # Jak si frontier pamatuje viděné URL - hash (64bit hashe), bloom (RedisBloom) nebo set (celé URL)
+        self.frontier = os.getenv('FRONTIER', frontier)
+        # Formát článků v Redisu - json nebo msgpack (msgpack + zstd se slovníkem, viz article_codec.py)
+        self.article_codec = os.getenv('ARTICLE_CODEC', article_codec)
+        self.store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass, frontier=self.frontier, article_codec=self.article_codec, metrics=self.metrics)
+        # Přeskakování téměř stejných článků (MinHash/LSH nad obsahem), 0 = vypnuto
+        self.dedup_threshold = float(os.getenv('DEDUP_THRESHOLD', dedup_threshold))
+        self.dedup = self.__create_dedup_index() if self.dedup_threshold and self.mode == ScraperMode.SCRAPE_ARTICLES else None
+        # Inkrementální průchod archivem skončí po tolika stránkách za sebou, na kterých není žádný nový článek
+        self.refresh_stop_pages = int(os.getenv('REFRESH_STOP_PAGES', refresh_stop_pages))
+        self.limiter = RateLimiter(self.store, rate=self.rate_limit, burst=self.rate_burst, max_concurrency=self.num_of_threads)
 
-    def __process_urls(self) -> None:
+    def __process_urls(self, raw_queue: queue.Queue = None) -> None:
         """
         Metoda bere URLs z queue, vyscrapuje je a uloží články do Redisu
+        [raw_queue] - v pipeline režimu se stažené odpovědi jen vloží do fronty a parsování i uložení řeší další stage
         [returns] -> url a informaci, které failnuly
         """
-        # Pro thread safety by každý thread měl mít svůj datastore
-        data_store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass)
+        # Pro thread safety by každý thread měl mít svůj datastore. V pipeline režimu potvrzuje URL writer,
+        # takže fetchery sdílí working_queue celého procesu
         thread_id = threading.get_ident()
+        worker_id = self.__worker_id() if raw_queue is not None else self.__worker_id(thread_id)
+        data_store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass, worker_id=worker_id, frontier=self.frontier, article_codec=self.article_codec, metrics=self.metrics)
+        writer = BatchWriter(data_store, max_items=self.write_batch_size, max_delay_ms=self.write_batch_ms)
+        # Session drží keep-alive spojení, takže se TCP/TLS handshake neopakuje u každého requestu
+        session = requests.Session()
+        scrape_queue = self.__scrape_queue()
 
-        if (self.mode == ScraperMode.SCRAPE_ARTICLES):
-            scrape_queue = "articles_queue"
-        else:
-            scrape_queue = "archive_queue"
+        logger.info(f"[{thread_id}] started scraping")
 
-        print(f"[{thread_id}] started scraping")
+        last_requeue = 0.0
 
         while True:
+            url = None
             try:
-                # Načtení adresy ze scrape_queue a přesun do workinq_queue
-                url = data_store.get_url_to_scrape(queue=scrape_queue)
+                # URL, kterým už vypršel backoff, se vrací zpět do fronty, heartbeat dává reaperu vědět, že žijeme
+                if monotonic() - last_requeue > 1:
+                    data_store.requeue_due(scrape_queue)
+                    data_store.heartbeat(scrape_queue)
+                    last_requeue = monotonic()
+
+                writer.flush_if_due()
+
+                # Načtení adresy ze scrape_queue a přesun do workinq_queue. Krátký timeout, aby se včas
+                # zapsala nedokončená dávka a vrátily URL z retry fronty
+                url = data_store.get_url_to_scrape(queue=scrape_queue, timeout=1)
                 if url is None:
                     continue
                 if "www.idnes.cz" not in url:
+                    # Cizí URL jen vyřadíme z working_queue, jinak by ji reaper vracel do fronty pořád dokola
+                    data_store.ack_scrape(url)
                     continue
-                
-                url.replace('/foto', '')
-        
-                print(f"[{thread_id}][{scrape_queue}] scrapes {url}")
-                response = requests.get(str(url), timeout=10)
+
+
+                # Ve frontě můžou být ještě URL z doby před kanonizací (/foto, sledovací parametry). Potvrzuje
+                # se původní URL, protože ta je ve working_queue
+                logger.debug("[%s][%s] scrapes %s", thread_id, scrape_queue, url)
+                content = self.__fetch(session, canonicalize_url(url))
+
+                if raw_queue is not None:
+                    # Plná fronta zablokuje fetcher, dokud parsery nedoženou síť
+                    raw_queue.put((url, content))
+                    continue
+
+                # Uložení a potvrzení, že jsme úspěšně vykonali scraping, jde po dávkách
                 if (self.mode == ScraperMode.SCRAPE_ARTICLES):
-                    article = parse_article(response.content)
-                    success = data_store.save_article(article)
+                    with self.metrics.timer("parse_article"):
+                        article = self.parse_article(content)
+                    self.__add_article(data_store, writer, url, article)
                 else:
-                    archive_urls = parse_archive_page(response.content)
-                    data_store.save_urls(archive_urls)
-                    success = True
-
-                # Potvrzení, že jsme úspěšně vykonali scraping
-                if success:
-                    data_store.ack_scrape(url)
-                else: 
-                    raise Exception(f"[{thread_id}] Couldn't save resource with url: {url}")
+                    with self.metrics.timer("parse_archive_page"):
+                        urls = self.parse_archive_page(content)
+                    writer.add_archive_page(url, urls)
                 
-            except requests.exceptions.RequestException as e:
-                msg = f"[{thread_id}] Most likely im ddosing the server, setting timeout for 2 mins {str(e)}"
-                data_store = data_store.log_error(msg)
-                sleep(120)
+            except (requests.exceptions.RequestException, RetryableError) as e:
+                # Místo uspání celého vlákna odložíme jen tuhle URL, zpomalení hostu zařídí limiter
+                self.__handle_failure(data_store, url, scrape_queue, e, thread_id)
                 continue
             except Exception as e:
                 msg = f"[{thread_id}] Exception occured at url {url} with error {str(e)}"
-                data_store = data_store.log_error(msg)
+                data_store.log_error(msg)
+                # Stránka, na které padá parser, se zkusí znovu a po max_retries skončí v dead letter
+                if url is not None:
+                    self.__handle_failure(data_store, url, scrape_queue, e, thread_id)
+                continue
+
+    def __create_dedup_index(self):
+        # numpy je potřeba jen pro deduplikaci
+        from dedup_index import DedupIndex, MinHasher
+        return DedupIndex(self.store, MinHasher(threshold=self.dedup_threshold))
+
+    def __add_article(self, data_store: DataStore, writer: BatchWriter, url: str, article: dict) -> None:
+        """
+        Přidá článek do dávky k uložení, téměř stejný článek jako už uložený jen potvrdí a zapíše do duplicit
+        """
+        duplicate = self.dedup.check_and_add(url, article) if self.dedup else None
+        if duplicate:
+            self.metrics.inc("duplicates")
+            data_store.skip_duplicate(url, *duplicate)
+            return
+        writer.add_article(url, article)
+
+    def __retry_delay(self, attempt: int, error: Exception) -> float:
+        return max(backoff_delay(attempt, cap=self.max_backoff), getattr(error, "retry_after", 0))
+
+    def __handle_failure(self, data_store: DataStore, url: str, scrape_queue: str, error: Exception, worker) -> None:
+        """
+        Zapíše neúspěšný pokus o URL a odloží ji s backoffem, po max_retries pokusech ji přesune do dead letter
+        """
+        attempt = data_store.register_failure(url, str(error))
+        if attempt > self.max_retries:
+            self.metrics.inc("dead_letter")
+            data_store.move_to_dead_letter(url, scrape_queue, str(error), attempt)
+            data_store.log_error(f"[{worker}] Giving up on {url} after {attempt} attempts: {str(error)}")
+            return
+
+        delay = self.__retry_delay(attempt, error)
+        self.metrics.inc("retries")
+        data_store.schedule_retry(url, scrape_queue, delay)
+        data_store.log_error(f"[{worker}] Request to {url} failed (attempt {attempt}), retrying in {delay:.1f} s: {str(error)}")
+
+    async def __handle_failure_async(self, data_store: AsyncDataStore, url: str, scrape_queue: str, error: Exception, worker) -> None:
+        attempt = await data_store.register_failure(url, str(error))
+        if attempt > self.max_retries:
+            self.metrics.inc("dead_letter")
+            await data_store.move_to_dead_letter(url, scrape_queue, str(error), attempt)
+            await data_store.log_error(f"[{worker}] Giving up on {url} after {attempt} attempts: {str(error)}")
+            return
+
+        delay = self.__retry_delay(attempt, error)
+        self.metrics.inc("retries")
+        await data_store.schedule_retry(url, scrape_queue, delay)
+        await data_store.log_error(f"[{worker}] Request to {url} failed (attempt {attempt}), retrying in {delay:.1f} s: {str(error)}")
+
+    def __reap_loop(self, interval=30) -> None:
+        """
+        Reaper běží v každém scraperu, takže URL mrtvého workera vrátí kterýkoli živý. Lua skript je atomický,
+        souběh víc reaperů nevadí
+        """
+        while True:
+            try:
+                moved = self.store.reap(self.visibility_timeout, self.heartbeat_timeout, self.max_retries)
+                if moved:
+                    logger.info(f"[reaper] returned {moved} urls to queue")
+            except Exception as e:
+                self.store.log_error(f"[reaper] Reaping failed with error {str(e)}")
+            sleep(interval)
+
+    def __migrate_frontier(self) -> None:
+        """
+        Převede starou množinu celých URL z doby před frontierem, jinak by se už viděné URL zařadily znovu
+        """
+        migrated = self.store.migrate_urls()
+        if migrated:
+            logger.info(f"Migrated {migrated} seen urls to the '{self.frontier}' frontier")
+
+    def __start_reaper(self) -> None:
+        threading.Thread(target=self.__reap_loop, daemon=True).start()
+
+    def __start_metrics(self) -> None:
+        """
+        Řádek se statistikami do logu a volitelně /metrics endpoint, hloubky front čte sdílený DataStore
+        """
+        if self.stats_interval > 0:
+            threading.Thread(target=run_stats_reporter, args=(self.metrics, self.store.queue_depths, self.stats_interval), daemon=True).start()
+        if self.metrics_port:
+            serve_metrics(self.metrics, self.store.queue_depths, self.metrics_port)
+            logger.info(f"Metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+
+
+    def __fetch(self, session: requests.Session, url: str) -> bytes:
+        """
+        Stáhne URL přes limiter, výsledek (429/5xx, timeout, latence) nahlásí AIMD.
+        S cache posílá podmíněný GET a na 304 vrátí tělo z cache
+        """
+        headers = self.cache.conditional_headers(url) if self.cache else {}
+
+        with self.limiter.slot(url) as controller:
+            started = monotonic()
+            try:
+                response = session.get(str(url), timeout=10, headers=headers)
+            except requests.exceptions.RequestException:
+                controller.on_failure()
+                self.metrics.inc("fetch_errors")
+                raise
+            finally:
+                self.metrics.observe("fetch", monotonic() - started)
+            if response.status_code == 429 or response.status_code >= 500:
+                controller.on_failure()
+                self.metrics.inc("fetch_errors")
+                raise RetryableError(f"HTTP {response.status_code}", retry_after_seconds(response.headers))
+            controller.on_success(monotonic() - started)
+            self.metrics.inc("pages")
+
+        if self.cache:
+            if response.status_code == 304:
+                return self.__cached_body(url)
+            self.cache.put(url, response.content, response.headers)
+
+        return response.content
+
+    async def __fetch_async(self, session: aiohttp.ClientSession, limiter: AsyncRateLimiter, url: str) -> bytes:
+        # Čtení metadat z disku stejně jako zápis do cache neblokuje event loop
+        headers = await asyncio.to_thread(self.cache.conditional_headers, url) if self.cache else {}
+
+        async with limiter.slot(url) as controller:
+            started = monotonic()
+            try:
+                async with session.get(str(url), headers=headers) as response:
+                    content = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                controller.on_failure()
+                self.metrics.inc("fetch_errors")
+                raise
+            finally:
+                self.metrics.observe("fetch", monotonic() - started)
+            if response.status == 429 or response.status >= 500:
+                controller.on_failure()
+                self.metrics.inc("fetch_errors")
+                raise RetryableError(f"HTTP {response.status}", retry_after_seconds(response.headers))
+            controller.on_success(monotonic() - started)
+            self.metrics.inc("pages")
+
+        if self.cache:
+            # Zápis na disk neblokuje event loop
+            if response.status == 304:
+                return await asyncio.to_thread(self.__cached_body, url)
+            await asyncio.to_thread(self.cache.put, url, content, response.headers)
+
+        return content
+
+    def __cached_body(self, url: str) -> bytes:
+        content = self.cache.get(url)
+        if content is None:
+            raise Exception(f"Got 304 for {url}, but the body is missing in cache")
+        self.cache.touch(url)
+        return content
+
+    def __dispatch_parsing(self, raw_queue: queue.Queue, results: queue.Queue, in_flight: threading.Semaphore, create_parsers) -> None:
+        """
+        Posílá stažené odpovědi do ProcessPoolExecutoru, [in_flight] omezuje počet rozparsovaných a ještě neuložených stránek.
+        Když parsovací proces spadne (např. OOM kill), pool je rozbitý - stránka jde přes retry zpět do fronty a pool
+        se vytvoří znovu. Bez toho by vlákno dispatcheru tiše skončilo a fetchery by navždy čekaly na plné raw_queue
+        [create_parsers] - funkce, která vytvoří nový ProcessPoolExecutor
+        """
+        parse = self.parse_article if self.mode == ScraperMode.SCRAPE_ARTICLES else self.parse_archive_page
+        data_store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass, worker_id=self.__worker_id(), frontier=self.frontier, article_codec=self.article_codec, metrics=self.metrics)
+        scrape_queue = self.__scrape_queue()
+        parsers = create_parsers()
+
+        while True:
+            url, content = raw_queue.get()
+            in_flight.acquire()
+            try:
+                # Parsování běží v jiném procesu, dobu vrací spolu s výsledkem
+                future = parsers.submit(timed_call, parse, content)
+                future.add_done_callback(lambda done, url=url: results.put((url, done)))
+            except Exception as e:
+                in_flight.release()
+                logger.exception(f"[dispatcher] Couldn't submit {url} for parsing")
+                if isinstance(e, BrokenProcessPool):
+                    parsers.shutdown(wait=False, cancel_futures=True)
+                    parsers = create_parsers()
+                try:
+                    self.__handle_failure(data_store, url, scrape_queue, e, "dispatcher")
+                except Exception:
+                    # URL zůstane ve working_queue a vrátí ji reaper
+                    logger.exception(f"[dispatcher] Couldn't schedule retry of {url}")
+
+    def __write_results(self, results: queue.Queue, in_flight: threading.Semaphore) -> None:
+        """
+        Sbírá výsledky parsování a ukládá je do Redisu po dávkách (write_batch_size kusů nebo write_batch_ms milisekund)
+        """
+        data_store = DataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass, worker_id=self.__worker_id(), frontier=self.frontier, article_codec=self.article_codec, metrics=self.metrics)
+        writer = BatchWriter(data_store, max_items=self.write_batch_size, max_delay_ms=self.write_batch_ms)
+        scrape_queue = self.__scrape_queue()
+
+        while True:
+            url = None
+            try:
+                url, future = results.get(timeout=self.write_batch_ms / 1000)
+                in_flight.release()
+                result, elapsed = future.result()
+                if self.mode == ScraperMode.SCRAPE_ARTICLES:
+                    self.metrics.observe("parse_article", elapsed)
+                    self.__add_article(data_store, writer, url, result)
+                else:
+                    self.metrics.observe("parse_archive_page", elapsed)
+                    writer.add_archive_page(url, result)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                data_store.log_error(f"[writer] Exception occured at url {url} with error {str(e)}")
+                if url is not None:
+                    self.__handle_failure(data_store, url, scrape_queue, e, "writer")
+
+            try:
+                writer.flush_if_due()
+            except Exception as e:
+                data_store.log_error(f"[writer] Couldn't save batch with error {str(e)}")
+
+    async def __process_urls_async(self, worker_id: int, session: aiohttp.ClientSession, data_store: AsyncDataStore, limiter: AsyncRateLimiter, writer: AsyncBatchWriter) -> None:
+        """
+        Asynchronní obdoba __process_urls - jedna korutina zpracovává jednu URL po druhé,
+        paralelismus zajišťuje počet korutin a sdílený pool spojení, parsování běží ve vláknech výchozího executoru
+        """
+        scrape_queue = self.__scrape_queue()
+        last_requeue = 0.0
+
+        while True:
+            url = None
+            try:
+                if monotonic() - last_requeue > 1:
+                    await data_store.requeue_due(scrape_queue)
+                    await data_store.heartbeat(scrape_queue)
+                    last_requeue = monotonic()
+
+                url = await data_store.get_url_to_scrape(queue=scrape_queue, timeout=1)
+                if url is None:
+                    continue
+                if "www.idnes.cz" not in url:
+                    await data_store.ack_scrape(url)
+                    continue
+
+                logger.debug("[%s][%s] scrapes %s", worker_id, scrape_queue, url)
+                content = await self.__fetch_async(session, limiter, canonicalize_url(url))
+
+                # Parsování je CPU práce na desítky ms, v event loopu by stálo všechny ostatní korutiny
+                if (self.mode == ScraperMode.SCRAPE_ARTICLES):
+                    article, elapsed = await asyncio.to_thread(timed_call, self.parse_article, content)
+                    self.metrics.observe("parse_article", elapsed)
+                    # MinHash a dotazy do Redisu jsou synchronní, v event loopu by blokovaly ostatní korutiny
+                    duplicate = await asyncio.to_thread(self.dedup.check_and_add, url, article) if self.dedup else None
+                    if duplicate:
+                        self.metrics.inc("duplicates")
+                        await data_store.skip_duplicate(url, *duplicate)
+                    else:
+                        await writer.add_article(url, article)
+                else:
+                    urls, elapsed = await asyncio.to_thread(timed_call, self.parse_archive_page, content)
+                    self.metrics.observe("parse_archive_page", elapsed)
+                    await writer.add_archive_page(url, urls)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError, RetryableError) as e:
+                await self.__handle_failure_async(data_store, url, scrape_queue, e, worker_id)
+                continue
+            except Exception as e:
+                msg = f"[{worker_id}] Exception occured at url {url} with error {str(e)}"
+                await data_store.log_error(msg)
+                if url is not None:
+                    await self.__handle_failure_async(data_store, url, scrape_queue, e, worker_id)
                 continue
 
+    async def __run_async(self) -> None:
+        # Každá korutina drží spojení při čekání v BRPOPLPUSH, rezerva je pro flusher a zápis chyb
+        data_store = AsyncDataStore(host=self.redis_host, port=self.redis_port, password=self.redis_pass, worker_id=self.__worker_id(), frontier=self.frontier,
+                                    codec=self.store.create_codec(self.article_codec), max_connections=self.concurrency + ASYNC_REDIS_SPARE_CONNECTIONS, metrics=self.metrics)
+        writer = AsyncBatchWriter(data_store, max_items=self.write_batch_size, max_delay_ms=self.write_batch_ms)
+        limiter = AsyncRateLimiter(data_store, rate=self.rate_limit, burst=self.rate_burst, max_concurrency=self.concurrency)
+        # Jeden connector = jeden pool keep-alive spojení sdílený všemi korutinami, limit drží počet requestů v letu
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=10)
+
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                await asyncio.gather(writer.run_flusher(), *[self.__process_urls_async(i, session, data_store, limiter, writer) for i in range(self.concurrency)])
+        finally:
+            await data_store.close()
+
+    def __worker_id(self, thread_id=None) -> str:
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        return f"{worker_id}:{thread_id}" if thread_id is not None else worker_id
+
+    def __scrape_queue(self) -> str:
+        if (self.mode == ScraperMode.SCRAPE_ARTICLES):
+            return "articles_queue"
+        return "archive_queue"
+
+    def reap(self) -> int:
+        """
+        Jednorázově vrátí do fronty URL mrtvých workerů a URL s prošlou zápůjčkou
+        """
+        return self.store.reap(self.visibility_timeout, self.heartbeat_timeout, self.max_retries)
+
+    def requeue_legacy_working_queue(self, working_queue="working_queue") -> int:
+        """
+        Vrátí do fronty URL ze starého sdíleného working_queue (z doby před working_queue pro každého workera)
+        """
+        return self.store.requeue_working_queue(working_queue, self.__scrape_queue(), self.max_retries)
 
-    def generate_archive(self,start=1, end=40398):
+    def generate_archive(self,start=1, end=ARCHIVE_PAGES):
         self.store.generate_archive_links(start, end)
 
     def clear(self):
         self.store.clear()
 
-    def dump_data(self,type="articles"):
-        if type == "articles":
+    def dump_data(self,type="articles", format="json", **kwargs):
+        """
+        [format] = {json, ndjson, parquet} - kwargs jdou do DataStore.dump_articles_ndjson, resp. dump_articles_parquet
+        """
+        if type == "articles" and format == "ndjson":
+            self.store.dump_articles_ndjson(**kwargs)
+        elif type == "articles" and format == "parquet":
+            self.store.dump_articles_parquet(**kwargs)
+        elif type == "articles":
             self.store.dump_articles()
         else:
             self.store.dump_urls()
         
+    def reparse_cache(self, chunk_size=10000):
+        """
+        Metoda přeparsuje všechny články z HTML cache bez jediného requestu a uloží je do Redisu.
+        Před spuštěním je potřeba smazat staré články, jinak budou v seznamu dvakrát
+        """
+        if self.cache is None:
+            raise ValueError("Reparse needs HTML_CACHE_DIR to be set")
+
+        parse = partial(parse_cached, self.parse_article)
+        entries = self.cache.iter_object_paths(kind="article")
+        mp_context = multiprocessing.get_context("spawn")
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.pipeline_processes, mp_context=mp_context) as executor:
+            # Po blocích, aby se pro 1.4M stránek nevytvořily všechny futures najednou
+            while chunk := list(islice(entries, chunk_size)):
+                futures = [(url, executor.submit(parse, path)) for url, path in chunk]
+                articles = []
+                for url, future in futures:
+                    try:
+                        articles.append(future.result())
+                    except Exception as e:
+                        self.store.log_error(f"[reparse] Exception occured at url {url} with error {str(e)}")
+
+                self.store.save_articles(articles)
+                logger.info(f"[reparse] saved {len(articles)} articles")
+
+    def refresh_archive(self, start=1, end=ARCHIVE_PAGES) -> int:
+        """
+        Inkrementální aktualizace - prochází archiv od nejnovější stránky a do articles_queue zařadí jen nové články.
+        Skončí, když refresh_stop_pages stránek za sebou nepřinese žádnou novou URL (nebo je stránka prázdná).
+        Na rozdíl od generate_archive nepotřebuje archive_queue, denní aktualizace tak stojí desítky stránek
+        místo celého archivu. Vrací počet nových URL
+        """
+        self.__migrate_frontier()
+        session = requests.Session()
+        new_urls = 0
+        known_pages = 0
+        pages = 0
+
+        for page in range(start, end + 1):
+            pages += 1
+            url = ARCHIVE_URL.format(page)
+            urls = self.parse_archive_page(self.__fetch_with_retries(session, url))
+            added = self.store.save_urls(urls) if urls else 0
+            new_urls += added
+            known_pages = known_pages + 1 if added == 0 else 0
+            logger.info(f"[refresh] page {page}: {added} new of {len(urls)} urls")
+            if known_pages >= self.refresh_stop_pages:
+                break
+
+        logger.info(f"[refresh] {new_urls} new urls from {pages} archive pages")
+        return new_urls
+
+    def __fetch_with_retries(self, session: requests.Session, url: str) -> bytes:
+        """
+        Stránka archivu mimo frontu - při chybě se zkouší znovu s backoffem, po max_retries pokusech chyba projde ven
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.__fetch(session, url)
+            except (requests.exceptions.RequestException, RetryableError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self.__retry_delay(attempt, e)
+                self.store.log_error(f"[refresh] Request to {url} failed (attempt {attempt}), retrying in {delay:.1f} s: {str(e)}")
+                sleep(delay)
+
     def run(self):
         """
         Metoda spustí na několika vláknech proces kradení URL adres na články nebo proces kradení článků
         """
+        if self.mode == ScraperMode.REPARSE_CACHE:
+            self.reparse_cache()
+            return
+        if self.mode == ScraperMode.REFRESH_ARCHIVE:
+            self.refresh_archive()
+            return
+
+        self.__migrate_frontier()
+        self.__start_reaper()
+        self.__start_metrics()
+
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_of_threads) as executor:
             for _ in range(self.num_of_threads):
                 executor.submit(self.__process_urls)
               
         executor.shutdown(wait=True)
 
-        print("Scraping of articles is done, no more urls in queue, Im shuting down")
+        logger.info("Scraping of articles is done, no more urls in queue, Im shuting down")
+
+    def run_pipeline(self):
+        """
+        Metoda spustí scraping jako pipeline: fetcher vlákna -> ohraničená fronta raw odpovědí -> ProcessPoolExecutor
+        s parsováním -> writer, který ukládá do Redisu po dávkách. Parsování tak běží na všech jádrech mimo GIL fetcherů
+        """
+        raw_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        results = queue.Queue()
+        in_flight = threading.Semaphore(self.pipeline_queue_size)
+        # spawn místo fork - forkovat proces s běžícími vlákny (a jejich zámky v redis/requests) není bezpečné
+        mp_context = multiprocessing.get_context("spawn")
+        self.__migrate_frontier()
+        self.__start_reaper()
+        self.__start_metrics()
+
+        create_parsers = partial(concurrent.futures.ProcessPoolExecutor, max_workers=self.pipeline_processes, mp_context=mp_context)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_of_threads + 2) as executor:
+            for _ in range(self.num_of_threads):
+                executor.submit(self.__process_urls, raw_queue)
+            executor.submit(self.__dispatch_parsing, raw_queue, results, in_flight, create_parsers)
+            executor.submit(self.__write_results, results, in_flight)
+
+        logger.info("Scraping of articles is done, no more urls in queue, Im shuting down")
+
+    def run_async(self):
+        """
+        Metoda spustí scraping v jednom vlákně přes asyncio - `concurrency` korutin sdílí pool keep-alive spojení,
+        takže můžeme mít stovky URL v letu bez stovek OS vláken
+        """
+        self.__migrate_frontier()
+        self.__start_reaper()
+        self.__start_metrics()
+        asyncio.run(self.__run_async())
+
+        logger.info("Scraping of articles is done, no more urls in queue, Im shuting down")
 
 if __name__ == "__main__": 
     scraper = IdnesScraper(redis_host='20.109.19.66', redis_port=6379, mode=ScraperMode.SCRAPE_ARCHIVE_URLS, num_of_threads=8, redis_pass="Heslo123")
     # scraper.clear()
     #scraper.generate_archive()
     #scraper.run()
+    #scraper.run_async()
+    #scraper.run_pipeline()
     scraper.dump_data()
\ No newline at end of file
@@ -0,0 +1,164 @@
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from time import perf_counter, monotonic, sleep
+
+# Metriky scraperu - doba jednotlivých fází (fetch, parsování, zápis a potvrzení v Redisu) jako histogramy,
+# čítače stránek/článků/chyb a hloubky front. Všechno je v paměti procesu, ven jdou jako periodický řádek
+# do logu (STATS_INTERVAL) nebo v textovém formátu Prometheus na http://localhost:<METRICS_PORT>/metrics.
+
+logger = logging.getLogger("scraper.metrics")
+
+# Horní meze bucketů latence v sekundách - 1 ms až ~65 s, každý bucket dvakrát širší
+LATENCY_BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+
+# Fáze, které jdou do řádku se statistikami, v tomhle pořadí
+STAGES = ("fetch", "parse_article", "parse_archive_page", "save_article", "save_urls", "ack_scrape")
+
+
+def timed_call(func, *args):
+    """
+    Zavolá func(*args) a vrátí (výsledek, doba v sekundách) - pro měření parsování v jiném procesu
+    """
+    started = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - started
+
+
+class Histogram:
+    """
+    Histogram s pevnými buckety, kvantily jsou odhad horní mezí bucketu
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.bounds)
+        histogram.counts, histogram.count, histogram.sum = list(self.counts), self.count, self.sum
+        return histogram
+
+
+class Metrics:
+    """
+    Čítače a histogramy sdílené všemi vlákny jednoho scraperu
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters = defaultdict(int)
+        self.__histograms = defaultdict(Histogram)
+
+    def inc(self, name: str, value=1) -> None:
+        with self.__lock:
+            self.__counters[name] += value
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.__lock:
+            self.__histograms[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - started)
+
+    def snapshot(self) -> tuple[dict[str, int], dict[str, Histogram]]:
+        with self.__lock:
+            return dict(self.__counters), {stage: histogram.copy() for stage, histogram in self.__histograms.items()}
+
+    def prometheus(self, gauges: dict[str, int]) -> str:
+        """
+        Metriky v textovém formátu Prometheus
+        """
+        counters, histograms = self.snapshot()
+        lines = []
+        for name, value in sorted(counters.items()):
+            lines.append(f"scraper_{name}_total {value}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f'scraper_queue_depth{{queue="{name}"}} {value}')
+        for stage, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+def stats_line(counters: dict[str, int], previous: dict[str, int], elapsed: float, histograms: dict[str, Histogram], gauges: dict[str, int]) -> str:
+    """
+    Jeden řádek se statistikami za posledních [elapsed] sekund - stránky/s, latence fází (p50/p95) a hloubky front
+    """
+    rate = (counters.get("pages", 0) - previous.get("pages", 0)) / elapsed if elapsed > 0 else 0.0
+    parts = [f"pages/s {rate:.1f}"]
+    parts.extend(f"{name} {value}" for name, value in sorted(counters.items()))
+    for stage in STAGES:
+        if stage in histograms and histograms[stage].count:
+            histogram = histograms[stage]
+            parts.append(f"{stage} p50 {histogram.quantile(0.5) * 1000:.0f} ms p95 {histogram.quantile(0.95) * 1000:.0f} ms")
+    parts.extend(f"{name} {value}" for name, value in gauges.items())
+    return " | ".join(parts)
+
+
+def run_stats_reporter(metrics: Metrics, gauges, interval: float) -> None:
+    """
+    Každých [interval] sekund zaloguje řádek se statistikami
+    [gauges] - funkce vracející hloubky front, typicky DataStore.queue_depths
+    """
+    previous, last = {}, monotonic()
+    while True:
+        sleep(interval)
+        try:
+            counters, histograms = metrics.snapshot()
+            now = monotonic()
+            logger.info(stats_line(counters, previous, now - last, histograms, gauges()))
+            previous, last = counters, now
+        except Exception as e:
+            logger.warning(f"Stats failed with error {str(e)}")
+
+
+def serve_metrics(metrics: Metrics, gauges, port: int, host="127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Spustí v daemon vlákně HTTP server s metrikami na /metrics, vrací server (shutdown() ho zastaví)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus(gauges()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import argparse
+import requests
+from time import perf_counter
+from idnes_parser import get_parser
+
+# Kontrola shody a benchmark parser backendů nad uloženými stránkami z idnes.cz
+# Soubory ve FIXTURES_DIR se jmenují article_*.html nebo archive_*.html, očekávané výstupy jsou v golden.json.
+# Stažené stránky jsou article_<n>.html/archive_<n>.html, ručně psané stránky pro okrajové případy (prázdné datum,
+# chybějící autor, ...) mají v názvu _edge_ a příkaz save je nemaže
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GOLDEN_FILE = os.path.join(FIXTURES_DIR, "golden.json")
+BACKENDS = ["bs4", "lxml"]
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR) -> dict[str, bytes]:
+    fixtures = {}
+    for name in sorted(os.listdir(fixtures_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(fixtures_dir, name), "rb") as file:
+                fixtures[name] = file.read()
+    return fixtures
+
+
+def is_edge_case(name: str) -> bool:
+    return "_edge_" in name
+
+
+def parse_fixture(backend: str, name: str, content: bytes):
+    parse_article, parse_archive_page = get_parser(backend)
+    if name.startswith("archive_"):
+        return parse_archive_page(content)
+    return parse_article(content)
+
+
+def save_fixtures(urls: list[str], fixtures_dir=FIXTURES_DIR, replace=False, articles=0) -> None:
+    """
+    Stáhne stránky do fixtures, jméno souboru určí typ stránky podle URL
+    [replace] - smaže dosavadní stažené stránky, ručně psané okrajové případy zůstanou
+    [articles] - z každé stažené stránky archivu uloží i prvních N článků, stačí tak zadat jen URL archivu
+    """
+    session = requests.Session()
+
+    def download(url: str):
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+        return url, response.content
+
+    pages = [download(url) for url in urls]
+    parse_archive_page = get_parser("bs4")[1]
+    for url, content in list(pages):
+        if "/archiv/" in url and articles:
+            pages.extend(download(article_url) for article_url in parse_archive_page(content)[:articles])
+
+    # Maže se až po úspěšném stažení všech stránek, aby chyba sítě nenechala fixtures prázdné
+    if replace:
+        for name in load_fixtures(fixtures_dir):
+            if not is_edge_case(name):
+                os.remove(os.path.join(fixtures_dir, name))
+
+    for url, content in pages:
+        kind = "archive" if "/archiv/" in url else "article"
+        index = len([name for name in os.listdir(fixtures_dir) if name.startswith(kind) and not is_edge_case(name)]) + 1
+        with open(os.path.join(fixtures_dir, f"{kind}_{index}.html"), "wb") as file:
+            file.write(content)
+        print(f"Saved {url} as {kind}_{index}.html")
+
+
+def write_golden(fixtures: dict[str, bytes], backend="bs4") -> None:
+    """
+    Golden soubor se generuje z referenčního BeautifulSoup parseru
+    """
+    golden = {name: parse_fixture(backend, name, content) for name, content in fixtures.items()}
+    with open(GOLDEN_FILE, "w", encoding="utf-8") as file:
+        json.dump(golden, file, indent=4, ensure_ascii=False)
+    print(f"Golden file written for {len(golden)} fixtures")
+
+
+def warn_if_only_edge_cases(fixtures: dict[str, bytes]) -> None:
+    if all(is_edge_case(name) for name in fixtures):
+        print("WARNING: fixtures contain only hand-written edge cases, not pages saved from idnes.cz - "
+              "add them with 'save --replace --articles 5 https://www.idnes.cz/zpravy/archiv/1'")
+
+
+def check(fixtures: dict[str, bytes], backends: list[str]) -> bool:
+    warn_if_only_edge_cases(fixtures)
+    with open(GOLDEN_FILE, "r", encoding="utf-8") as file:
+        golden = json.load(file)
+
+    ok = True
+    for backend in backends:
+        for name, content in fixtures.items():
+            if name not in golden:
+                print(f"[{backend}] {name}: missing in golden file")
+                ok = False
+                continue
+            result = parse_fixture(backend, name, content)
+            if result != golden[name]:
+                ok = False
+                print(f"[{backend}] {name}: MISMATCH")
+                if isinstance(result, dict):
+                    for key in golden[name]:
+                        if result.get(key) != golden[name][key]:
+                            print(f"    {key}: expected {golden[name][key]!r}, got {result.get(key)!r}")
+            else:
+                print(f"[{backend}] {name}: ok")
+    return ok
+
+
+def benchmark(fixtures: dict[str, bytes], backends: list[str], repeat=50) -> None:
+    # Ruční stránky jsou o řád menší než skutečné, rychlost by přeceňovaly
+    warn_if_only_edge_cases(fixtures)
+    fixtures = {name: content for name, content in fixtures.items() if not is_edge_case(name)} or fixtures
+    for backend in backends:
+        started = perf_counter()
+        for _ in range(repeat):
+            for name, content in fixtures.items():
+                parse_fixture(backend, name, content)
+        elapsed = perf_counter() - started
+        pages = repeat * len(fixtures)
+        print(f"{backend:>5}: {pages / elapsed:10.1f} pages/sec ({pages} pages in {elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Equivalence check and benchmark of idnes parser backends")
+    parser.add_argument("command", choices=["check", "bench", "golden", "save"])
+    parser.add_argument("urls", nargs="*", help="URLs to save as fixtures (command save)")
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="backend to check/benchmark, default all")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--replace", action="store_true", help="drop the saved pages before saving, edge cases stay (command save)")
+    parser.add_argument("--articles", type=int, default=0, help="also save the first N articles of every archive page (command save)")
+    args = parser.parse_intermixed_args()
+
+    backends = args.backend or BACKENDS
+
+    if args.command == "save":
+        save_fixtures(args.urls, replace=args.replace, articles=args.articles)
+        # Golden soubor musí odpovídat uloženým stránkám
+        write_golden(load_fixtures())
+    elif args.command == "golden":
+        write_golden(load_fixtures())
+    elif args.command == "check":
+        sys.exit(0 if check(load_fixtures(), backends) else 1)
+    else:
+        benchmark(load_fixtures(), backends, args.repeat)
@@ -0,0 +1,163 @@
+import random
+import asyncio
+import threading
+from time import sleep, monotonic
+from urllib.parse import urlparse
+from contextlib import contextmanager, asynccontextmanager
+
+
+def backoff_delay(attempt: int, base=1.0, cap=60.0) -> float:
+    """
+    Exponenciální backoff s "full jitter" - vrátí náhodnou dobu čekání v sekundách
+    [attempt] - kolikátý pokus o URL selhal (od 1)
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class AimdController:
+    """
+    AIMD (additive increase, multiplicative decrease) řízení počtu souběžných requestů na jeden host.
+    Úspěch s rozumnou latencí přidá 1/limit (tj. zhruba +1 za "kolo"), 429/5xx/timeout nebo pomalá
+    odpověď limit vynásobí `decrease_factor`. Snížení se provede nejvýše jednou za `cooldown` sekund,
+    aby jedna vlna chyb ze všech vláken nesrazila limit rovnou na minimum.
+    """
+    def __init__(self, min_limit=1, max_limit=100, initial_limit=None, decrease_factor=0.5, latency_target=3.0, cooldown=1.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.__limit = float(initial_limit or max_limit)
+        self.__last_decrease = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self.__limit))
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.latency_target:
+            self.on_failure()
+            return
+
+        with self.__lock:
+            self.__limit = min(self.max_limit, self.__limit + 1 / self.__limit)
+
+    def on_failure(self) -> None:
+        with self.__lock:
+            now = monotonic()
+            if now - self.__last_decrease < self.cooldown:
+                return
+            self.__last_decrease = now
+            self.__limit = max(self.min_limit, self.__limit * self.decrease_factor)
+
+
+class _HostState:
+    def __init__(self, controller: AimdController, condition):
+        self.controller = controller
+        self.condition = condition
+        self.in_flight = 0
+
+
+class RateLimiter:
+    """
+    Limiter pro vláknový scraper. Globální rozpočet requestů za sekundu drží token bucket v Redisu
+    (sdílí ho všechny procesy), počet souběžných requestů na host řídí AimdController.
+    [store] - DataStore, přes který se berou tokeny
+    [rate] - počet requestů za sekundu pro jeden host napříč všemi scrapery
+    [burst] - kapacita bucketu
+    """
+    def __init__(self, store, rate=20.0, burst=40, max_concurrency=5, latency_target=3.0):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.__hosts = {}
+        self.__lock = threading.Lock()
+
+    def __host_state(self, host: str) -> _HostState:
+        with self.__lock:
+            if host not in self.__hosts:
+                controller = AimdController(max_limit=self.max_concurrency, latency_target=self.latency_target)
+                self.__hosts[host] = _HostState(controller, threading.Condition())
+            return self.__hosts[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """
+        Počká na token a na volné místo v limitu souběžnosti hostu, vrací AimdController,
+        kterému má volající nahlásit výsledek requestu
+        """
+        host = urlparse(url).netloc
+        state = self.__host_state(host)
+
+        while (wait_ms := self.store.take_token(f"rate_limit:{host}", self.rate, self.burst)) > 0:
+            sleep(wait_ms / 1000)
+
+        with state.condition:
+            state.condition.wait_for(lambda: state.in_flight < state.controller.limit)
+            state.in_flight += 1
+        try:
+            yield state.controller
+        finally:
+            with state.condition:
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+
+class AsyncRateLimiter:
+    """
+    Stejný limiter jako RateLimiter, jen pro asyncio runner a AsyncDataStore
+    """
+    def __init__(self, store, rate=20.0, burst=40, max_concurrency=100, latency_target=3.0):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.__hosts = {}
+
+    def __host_state(self, host: str) -> _HostState:
+        if host not in self.__hosts:
+            controller = AimdController(max_limit=self.max_concurrency, latency_target=self.latency_target)
+            self.__hosts[host] = _HostState(controller, asyncio.Condition())
+        return self.__hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = urlparse(url).netloc
+        state = self.__host_state(host)
+
+        while (wait_ms := await self.store.take_token(f"rate_limit:{host}", self.rate, self.burst)) > 0:
+            await asyncio.sleep(wait_ms / 1000)
+
+        async with state.condition:
+            await state.condition.wait_for(lambda: state.in_flight < state.controller.limit)
+            state.in_flight += 1
+        try:
+            yield state.controller
+        finally:
+            async with state.condition:
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+
+class RetryableError(Exception):
+    """
+    Odpověď, kterou má smysl zkusit znovu později (429, 5xx)
+    [retry_after] - doba v sekundách z hlavičky Retry-After, pokud ji server poslal
+    """
+    def __init__(self, message: str, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers) -> float:
+    """
+    Vrátí hodnotu hlavičky Retry-After v sekundách, formát s datem ignorujeme
+    """
+    value = headers.get("Retry-After")
+    if value and value.strip().isdigit():
+        return float(value)
+    return 0.0
@@ -0,0 +1,119 @@
+import zlib
+import numpy as np
+from tokenizer import tokenize
+
+# Hledání téměř stejných článků (přetištěné články s upraveným titulkem, drobné opravy textu) přes MinHash a LSH.
+# Obsah článku se rozloží na shingly (k po sobě jdoucích slov), MinHash signatura odhaduje Jaccardovu podobnost
+# množin shinglů. Signatura se rozdělí do pásem (bands) a články se stejným hashem některého pásma jsou kandidáti,
+# takže se neporovnává každý s každým. Kandidáti se ověří podle shody signatur a spojí union-findem do clusterů.
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+# Lichá konstanta pro skládání hashů slov do hashe shinglu a hashů řádků do hashe pásma
+MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def lsh_parameters(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    Vybere počet pásem a řádků v pásmu (bands * rows = num_perm), aby práh LSH (1/b)^(1/r) byl co nejblíž [threshold]
+    """
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class MinHasher:
+    """
+    [num_perm] - délka signatury, chyba odhadu podobnosti je zhruba 1/sqrt(num_perm)
+    [shingle_size] - počet slov v shinglu
+    [seed] - permutace musí být všude stejné, jinak nejsou signatury porovnatelné
+    """
+    def __init__(self, num_perm=64, shingle_size=5, threshold=0.8, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.seed = seed
+        self.bands, self.rows = lsh_parameters(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32, aby a * x (x je 32bitový hash) nepřeteklo přes 64 bitů
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    @property
+    def config(self) -> tuple:
+        return self.num_perm, self.shingle_size, self.threshold, self.seed
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        32bitové hashe unikátních shinglů textu. Hash slova je crc32 - stabilní napříč procesy, na rozdíl od hash()
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return np.empty(0, dtype=np.uint64)
+
+        token_hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+        size = min(self.shingle_size, len(tokens))
+        count = len(tokens) - size + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * MULTIPLIER + token_hashes[offset:offset + count]
+        return np.unique((hashes ^ (hashes >> np.uint64(32))) & MAX_HASH)
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """
+        MinHash signatura jako uint32 pole délky num_perm, None pro článek bez textu
+        """
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return None
+        hashes = (shingles[:, None] * self.a[None, :] + self.b[None, :]) % MERSENNE_PRIME & MAX_HASH
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        Hash každého pásma signatur, tvar (počet signatur, bands)
+        """
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        hashes = np.zeros(bands.shape[:2], dtype=np.uint64)
+        for row in range(self.rows):
+            hashes = hashes * MULTIPLIER + bands[:, :, row]
+        return hashes
+
+    @staticmethod
+    def similarity(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """
+        Odhad Jaccardovy podobnosti - podíl shodných pozic v signaturách (funguje i po řádcích matic)
+        """
+        return (left == right).mean(axis=-1)
+
+
+def _find(parent: list[int], item: int) -> int:
+    while parent[item] != item:
+        parent[item] = parent[parent[item]]
+        item = parent[item]
+    return item
+
+
+def find_clusters(hasher: MinHasher, signatures: np.ndarray) -> list[list[int]]:
+    """
+    Vrátí clustery (seznamy indexů signatur) téměř stejných článků, jen clustery s víc než jedním článkem.
+    Pro každé pásmo se signatury seřadí podle hashe pásma a ověřují se jen sousedé se stejným hashem, takže
+    je to O(n log n) i pro velké skupiny (např. stejný boilerplate) - cluster se poskládá z řetězu sousedů
+    """
+    parent = list(range(len(signatures)))
+    band_hashes = hasher.band_hashes(signatures)
+
+    for band in range(hasher.bands):
+        column = band_hashes[:, band]
+        order = np.argsort(column, kind="stable")
+        same = column[order[1:]] == column[order[:-1]]
+        left, right = order[:-1][same], order[1:][same]
+        similar = hasher.similarity(signatures[left], signatures[right]) >= hasher.threshold
+        for a, b in zip(left[similar].tolist(), right[similar].tolist()):
+            root_a, root_b = _find(parent, a), _find(parent, b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for item in range(len(parent)):
+        clusters.setdefault(_find(parent, item), []).append(item)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
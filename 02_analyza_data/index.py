@@ -1,9 +1,7 @@
-import re
-import ijson
-import hashlib
-from datetime import datetime
-from collections import Counter
-from collections import defaultdict
+import os
+from stats_engine import compute, load_checkpoint, save_checkpoint
+from tokenizer import load_stopwords
+from dedup import MinHasher
 
 MONTHS = [
     "Leden", "Únor", "Březen", "Duben", "Květen", "Červen",
@@ -11,110 +9,41 @@ MONTHS = [
 ]
 
 
-def load_stopwords(file_path = "./czech_stopwords.txt") -> list[str]:
-    """
-    Funkce načte seznam stopwordu ukradené z 
-    https://raw.githubusercontent.com/stopwords-iso/stopwords-cs/master/stopwords-cs.txt
-    """
-    word_list = []
-    with open(file_path, "r", encoding="utf-8") as file:
-        word_list = [line.strip() for line in file] 
-    
-    return word_list
-
-
 if __name__ == "__main__":
     stop_words = load_stopwords()
-    
-    filepath = "../01_idnes_scraper/idnes_articles_data.json"
-
-    number_of_articles = 0
-    number_of_comments = 0
-    number_of_words = 0
-    article_hashes = []
-
-
-    oldest_article = None
-    oldest_published_date = None
-
-    most_commented_article = None
-    most_illustrated_article = None
-    
-    article_categories = defaultdict(int)
-    articles_per_year =  defaultdict(int)
-    
-    content_freq = Counter()
-    month_publish_freq = Counter()
-
-    article_with_most_words = None
-    article_with_least_words = None
-
-    top_covid_articles = []
-    article_name_freq = Counter()
-
-    with open(filepath, "rb") as file:
-       for item in ijson.items(file, "item"):
-            number_of_articles+=1
-            article_hashes.append(hashlib.md5(str(item["article_name"]).replace(" ", "").encode()).hexdigest() )
-            
-            # Nalezení nejstaršího článku
-            if item["article_published_time"]:
-                published_date = datetime.fromisoformat(item["article_published_time"])  
-                
-                articles_per_year[published_date.year] += 1
-                month_publish_freq[published_date.month] += 1
-
-                if published_date.year == 2021:
-                    if item["article_name"]:
-                        words = re.findall(r'\w+', item["article_name"])
-                        words = [word.lower() for word in words]
-                        article_name_freq.update(words)
-
-            if oldest_published_date is None or (published_date and published_date < oldest_published_date):
-                    oldest_published_date = published_date
-                    oldest_article = item
-
-            # Pracování s obsahem
-            if item["article_content"]:
-                words = re.findall(r'\w+', item["article_content"])
-                words = [word.lower() for word in words]
-                words_len = len(words)
-                item["content_w_length"] = words_len
-                number_of_words += words_len
-                content_freq.update(words) 
-
-                if article_with_least_words is None or ( item["content_w_length"] > 10 and item["content_w_length"] < article_with_least_words["content_w_length"]):
-                     article_with_least_words = item
-                
-                if article_with_most_words is None or item["content_w_length"] > article_with_most_words["content_w_length"]:
-                     article_with_most_words = item
-
-                covid_count = words.count("covid")
-                if covid_count > 0: 
-                    if len(top_covid_articles) < 3 or covid_count > top_covid_articles[-1][1]:
-                        top_covid_articles.append((item, covid_count))
-                        top_covid_articles.sort(key=lambda x: x[1], reverse=True)
-                        top_covid_articles = top_covid_articles[:3]
-        
-
-            if item["article_category"]:
-                article_categories[item["article_category"]] += 1
 
-            # Největší počet obrázků
-            if item["article_image_count"]:
-                if most_illustrated_article is None or item["article_image_count"] > most_illustrated_article["article_image_count"]:
-                     most_illustrated_article = item
-
-            # Pracování s komentáři
-            if item["article_comment_count"]:
-                article_comment_count =  item["article_comment_count"]
-                number_of_comments += article_comment_count
-
-                if most_commented_article is None or article_comment_count > most_commented_article["article_comment_count"]:
-                     most_commented_article = item
-
-    hash_counts = Counter(article_hashes)
-    collisions = [hash for hash, count in hash_counts.items() if count > 1]
+    # Vstup může být víc souborů (např. shardy z DataStore.dump_articles_ndjson) nebo seznam článků
+    # přímo v Redisu (redis://:heslo@host:6379/0#data_idnes_articles), oddělené čárkou
+    filepaths = os.getenv("STATS_INPUT", "../01_idnes_scraper/idnes_articles_data.json").split(",")
+    processes = int(os.getenv("STATS_PROCESSES", os.cpu_count()))
+    # Počet počítadel přibližného počítání slov, 0 = přesný Counter
+    word_sketch_capacity = int(os.getenv("STATS_WORD_SKETCH", 0))
+    # Práh podobnosti obsahu pro hledání téměř stejných článků (MinHash/LSH), 0 = nehledat
+    dedup_threshold = float(os.getenv("STATS_DEDUP_THRESHOLD", 0))
+    hasher = MinHasher(threshold=dedup_threshold) if dedup_threshold else None
+
+    # Checkpoint s agregáty a pozicí ve vstupech - další běh přičte jen nové články
+    checkpoint_path = os.getenv("STATS_CHECKPOINT")
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+
+    stats = compute(filepaths, processes, word_sketch_capacity, hasher, checkpoint)
+    if checkpoint_path:
+        save_checkpoint(stats, checkpoint_path)
+
+    number_of_articles = stats.number_of_articles
+    number_of_comments = stats.number_of_comments
+    number_of_words = stats.number_of_words
+    oldest_article = stats.oldest_article
+    most_commented_article = stats.most_commented_article
+    most_illustrated_article = stats.most_illustrated_article
+    article_with_most_words = stats.article_with_most_words
+    article_with_least_words = stats.article_with_least_words
+    top_covid_articles = stats.top_covid_articles
+    article_categories = stats.article_categories
+    articles_per_year = stats.articles_per_year
+    month_publish_freq = stats.month_publish_freq
+    content_freq = stats.content_freq
+    article_name_freq = stats.article_name_freq
 
 
     words_without_stopwords =  [(word, freq) for word, freq in content_freq.items() if word not in stop_words]
@@ -123,9 +52,10 @@ if __name__ == "__main__":
     most_common = [(word, freq) for word, freq in words_without_stopwords if len(word) < 6]
     most_common.sort(key=lambda x: x[1], reverse=True)
 
-    # Average přes všechny články bez stopwordů
-    total_length = sum(len(word) for word, _ in words_without_stopwords)
-    average_length = total_length / len(words_without_stopwords)
+    # Average přes všechny články bez stopwordů - potřebuje všechna různá slova, takže jen v přesném režimu
+    if not stats.approximate:
+        total_length = sum(len(word) for word, _ in words_without_stopwords)
+        average_length = total_length / len(words_without_stopwords)
 
     # Publikace v měsících (předpokládám, že to bereme celkově a ne po letech)
     most_published_month, most_published_count = month_publish_freq.most_common(1)[0]
@@ -137,7 +67,12 @@ if __name__ == "__main__":
 
 
     print(f"Number of articles: {number_of_articles}")
-    print(f"Number of duplicites: {len(collisions)}")
+    print(f"Number of duplicites: {stats.number_of_duplicates}")
+    if hasher is not None:
+        clusters = stats.near_duplicate_clusters()
+        print(f"Number of near-duplicate clusters (content similarity >= {dedup_threshold}): {len(clusters)} with {sum(map(len, clusters))} articles")
+        for cluster in sorted(clusters, key=len, reverse=True)[:5]:
+            print(f"    {len(cluster)}x: {cluster[0]}")
     print(f"Oldest article: {oldest_article['article_published_time']}")
     print(f"Total number of comments: {number_of_comments}")
     print(f"Total number of words: {number_of_words}")
@@ -147,7 +82,10 @@ if __name__ == "__main__":
     print(f"Most words in article: {article_with_most_words["article_name"]} with {article_with_most_words["content_w_length"]} words")
     print(f"Most words in article: {article_with_least_words["article_name"]} with {article_with_least_words["content_w_length"]} words")
 
-    print(f"Average length of word: {average_length}")
+    if stats.approximate:
+        print("Average length of word: n/a in approximate mode")
+    else:
+        print(f"Average length of word: {average_length}")
 
     print("Top three articles with the most occurrences of 'covid':")
     for i, (article, count) in enumerate(top_covid_articles):
@@ -164,7 +102,13 @@ if __name__ == "__main__":
 
     print("Most common words in content with < 6 words:")
     for word, frequency in most_common[:8]:
-        print(f"{word}: {frequency}")
+        if stats.approximate:
+            # Skutečný počet je v intervalu [frequency, frequency + error]
+            print(f"{word}: {frequency} (+0..{content_freq.error})")
+        else:
+            print(f"{word}: {frequency}")
+    if stats.approximate:
+        print(f"Approximate counts: {len(content_freq)} counters, error <= {content_freq.error} (bound {content_freq.error_bound:.0f} = {content_freq.total} words / {content_freq.capacity + 1})")
 
     
     for year, count in articles_per_year.items():
@@ -0,0 +1,491 @@
+import os
+import json
+import mmap
+import heapq
+import bisect
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from array import array
+from time import perf_counter
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from stats_engine import read_shard
+from tokenizer import tokenize
+
+# Invertovaný index nad korpusem, aby se dotazy ("které články nejvíc zmiňují covid", "články autora X",
+# "počty článků podle kategorie v 2022") nemusely řešit průchodem celého dumpu. Staví se SPIMI: postingy
+# se sbírají v paměti, po [block_postings] se seřazené zapíšou jako blok na disk a na konci se bloky
+# sloučí (k-way merge) do jednoho souboru postingů na pole. Postingy jsou delta + varint komprimované
+# a dekódují se vektorově přes numpy.
+#
+# Adresář indexu:
+#   meta.json                - počet článků, pole
+#   names.bin, names.npy     - titulky a jejich offsety
+#   published.npy            - datum publikace (datetime64[s], NaT když chybí)
+#   comments.npy             - počet komentářů
+#   <pole>.terms             - seřazené termy oddělené \n
+#   <pole>.lexicon.npz       - offset, délka a df postingů každého termu
+#   <pole>.postings          - postingy všech termů za sebou
+#
+# Postingy termu: varint počet článků, rozdíly id článků, u pozičních polí ještě tf každého článku
+# a pozice slov (v rámci článku rozdíly od předchozí pozice).
+
+# pole -> jestli se ukládají pozice slov (potřeba pro frázové dotazy)
+FIELDS = {"content": True, "keyword": False, "author": False, "category": False}
+BLOCK_POSTINGS = 20_000_000
+EPOCH = datetime(1970, 1, 1)
+NAT = np.iinfo(np.int64).min
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _read_varint(data, position=0) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def encode_varints(values) -> bytes:
+    """
+    Varint (LEB128) kódování celého pole najednou - 7 bitů na bajt, horní bit říká, že číslo pokračuje
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for byte in range(int(lengths.max())):
+        mask = lengths > byte
+        more = (lengths[mask] > byte + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + byte] = (values[mask] >> np.uint64(7 * byte)) & np.uint64(0x7F) | more
+    return out.tobytes()
+
+
+def decode_varints(data) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)) * 7
+    return np.add.reduceat((raw & 0x7F).astype(np.uint64) << shifts.astype(np.uint64), starts)
+
+
+def encode_postings(docs, tfs=None, positions=None) -> bytes:
+    docs = np.asarray(docs, dtype=np.int64)
+    parts = [np.array([len(docs)], dtype=np.int64), np.diff(docs, prepend=0)]
+    if positions is not None:
+        tfs = np.asarray(tfs, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = np.cumsum(tfs) - tfs
+        gaps = np.diff(positions, prepend=0)
+        gaps[starts] = positions[starts]
+        parts += [tfs, gaps]
+    return encode_varints(np.concatenate(parts))
+
+
+def decode_postings(data, positional: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+    """
+    Vrátí (id článků, tf, pozice). Pozice jsou za sebou pro všechny články, článek i má tfs[i] pozic
+    """
+    values = decode_varints(data).astype(np.int64)
+    count = int(values[0])
+    docs = np.cumsum(values[1:1 + count])
+    if not positional:
+        return docs, np.ones(count, dtype=np.int64), None
+
+    tfs = values[1 + count:1 + 2 * count]
+    gaps = values[1 + 2 * count:]
+    positions = np.cumsum(gaps)
+    starts = np.cumsum(tfs) - tfs
+    # cumsum jde přes hranice článků, takže se od každého článku odečte součet před jeho začátkem
+    positions -= np.repeat(positions[starts] - gaps[starts], tfs)
+    return docs, tfs, positions
+
+
+def _read_file_varint(file) -> int | None:
+    result = shift = 0
+    while byte := file.read(1):
+        result |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
+    return None
+
+
+def _read_block(path: str):
+    # Bloky se čtou proudově, při merge je otevřený každý blok, ale v paměti je jen aktuální term
+    with open(path, "rb", buffering=1 << 20) as file:
+        while (length := _read_file_varint(file)) is not None:
+            term = file.read(length).decode()
+            yield term, file.read(_read_file_varint(file))
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.split())
+
+
+def _parse_published_time(value: str | None) -> int:
+    if not value:
+        return NAT
+    try:
+        return int((datetime.fromisoformat(value).replace(tzinfo=None) - EPOCH).total_seconds())
+    except ValueError:
+        return NAT
+
+
+class IndexBuilder:
+    """
+    Staví index do [directory] po jednom článku (SPIMI). [block_postings] - kolik postingů (pozic slov
+    a hodnot ostatních polí) se drží v paměti, než se zapíšou jako blok
+    """
+    def __init__(self, directory: str, block_postings=BLOCK_POSTINGS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.block_postings = block_postings
+        self.blocks = {field: [] for field in FIELDS}
+        self.postings = {field: {} for field in FIELDS}
+        self.size = 0
+        self.number_of_documents = 0
+        self.names = open(os.path.join(directory, "names.bin"), "wb")
+        self.name_offsets = array("Q", [0])
+        self.published = array("q")
+        self.comments = array("i")
+        self.tmp = tempfile.mkdtemp(prefix="blocks-", dir=directory)
+
+    def add(self, article: dict) -> int:
+        doc = self.number_of_documents
+
+        positions = {}
+        for position, token in enumerate(tokenize(article.get("article_content") or "")):
+            positions.setdefault(token, []).append(position)
+        content = self.postings["content"]
+        for token, token_positions in positions.items():
+            entry = content.get(token)
+            if entry is None:
+                entry = content[token] = (array("I"), array("I"), array("I"))
+            entry[0].append(doc)
+            entry[1].append(len(token_positions))
+            entry[2].extend(token_positions)
+            self.size += len(token_positions)
+
+        for field, values in (("keyword", article.get("article_keywords")), ("author", article.get("article_author")), ("category", article.get("article_category"))):
+            if isinstance(values, str):
+                values = [values]
+            for value in {_normalize(value) for value in values or [] if value and value.strip()}:
+                self.postings[field].setdefault(value, array("I")).append(doc)
+                self.size += 1
+
+        name = (article.get("article_name") or "").encode()
+        self.names.write(name)
+        self.name_offsets.append(self.name_offsets[-1] + len(name))
+        self.published.append(_parse_published_time(article.get("article_published_time")))
+        self.comments.append(int(article.get("article_comment_count") or 0))
+
+        self.number_of_documents += 1
+        if self.size >= self.block_postings:
+            self.flush()
+        return doc
+
+    def flush(self) -> None:
+        """
+        Zapíše postingy z paměti jako seřazený blok, id článků v bloku jsou vždy větší než v předchozích
+        """
+        for field, postings in self.postings.items():
+            if not postings:
+                continue
+            path = os.path.join(self.tmp, f"{field}-{len(self.blocks[field]):05d}.block")
+            with open(path, "wb") as file:
+                for term in sorted(postings):
+                    entry = postings[term]
+                    payload = encode_postings(*entry) if FIELDS[field] else encode_postings(entry)
+                    encoded = term.encode()
+                    file.write(_varint(len(encoded)) + encoded + _varint(len(payload)) + payload)
+            self.blocks[field].append(path)
+        self.postings = {field: {} for field in FIELDS}
+        self.size = 0
+
+    def _merge(self, field: str) -> None:
+        positional = FIELDS[field]
+        terms, offsets, lengths, dfs = [], array("Q"), array("Q"), array("Q")
+        offset = 0
+        with open(os.path.join(self.directory, f"{field}.postings"), "wb") as output:
+            # heapq.merge je stabilní, takže stejné termy přijdou v pořadí bloků = ve vzestupném pořadí id článků
+            merged = heapq.merge(*(_read_block(path) for path in self.blocks[field]), key=itemgetter(0))
+            for term, group in groupby(merged, key=itemgetter(0)):
+                payloads = [payload for _, payload in group]
+                if len(payloads) == 1:
+                    # První id v bloku je uložené absolutně, takže postingy z jednoho bloku jsou rovnou výsledné
+                    payload = payloads[0]
+                    df = _read_varint(payload)[0]
+                else:
+                    decoded = [decode_postings(payload, positional) for payload in payloads]
+                    docs = np.concatenate([docs for docs, _, _ in decoded])
+                    if positional:
+                        payload = encode_postings(docs, np.concatenate([tfs for _, tfs, _ in decoded]), np.concatenate([positions for _, _, positions in decoded]))
+                    else:
+                        payload = encode_postings(docs)
+                    df = len(docs)
+
+                output.write(payload)
+                terms.append(term)
+                offsets.append(offset)
+                lengths.append(len(payload))
+                dfs.append(df)
+                offset += len(payload)
+
+        with open(os.path.join(self.directory, f"{field}.terms"), "w", encoding="utf-8") as file:
+            file.write("\n".join(terms))
+        np.savez(os.path.join(self.directory, f"{field}.lexicon.npz"), offsets=np.frombuffer(offsets, dtype=np.uint64), lengths=np.frombuffer(lengths, dtype=np.uint64), dfs=np.frombuffer(dfs, dtype=np.uint64))
+
+    def finish(self) -> None:
+        self.flush()
+        for field in FIELDS:
+            self._merge(field)
+        shutil.rmtree(self.tmp)
+
+        self.names.close()
+        np.save(os.path.join(self.directory, "names.npy"), np.frombuffer(self.name_offsets, dtype=np.uint64))
+        np.save(os.path.join(self.directory, "published.npy"), np.frombuffer(self.published, dtype=np.int64).view("datetime64[s]"))
+        np.save(os.path.join(self.directory, "comments.npy"), np.frombuffer(self.comments, dtype=np.int32))
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"documents": self.number_of_documents, "fields": FIELDS}, file)
+
+
+def build_index(paths: list[str], directory: str, block_postings=BLOCK_POSTINGS) -> int:
+    """
+    Postaví index ze vstupů (stejné jako pro statistiky - JSON dump, NDJSON, .gz/.zst, redis://), id článku
+    je jeho pořadí ve vstupech
+    """
+    builder = IndexBuilder(directory, block_postings)
+    for path in paths:
+        end = None
+        if path.startswith("redis://"):
+            from stats_engine import _source_end
+            end = _source_end(path)
+        for article in read_shard(path, 0, end):
+            if builder.add(article) % 100000 == 99999:
+                print(f"[index] {builder.number_of_documents} articles")
+    builder.finish()
+    return builder.number_of_documents
+
+
+class InvertedIndex:
+    """
+    Dotazy nad indexem z [directory]. Lexikony a postingy (mmap) se načítají líně při prvním dotazu na pole
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.name_offsets = np.load(os.path.join(directory, "names.npy"))
+        self.published = np.load(os.path.join(directory, "published.npy"))
+        self.comments = np.load(os.path.join(directory, "comments.npy"))
+        with open(os.path.join(directory, "names.bin"), "rb") as file:
+            self.names = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.name_offsets[-1] else b""
+        self._lexicons = {}
+
+    def __len__(self) -> int:
+        return self.meta["documents"]
+
+    def _lexicon(self, field: str):
+        if field not in self._lexicons:
+            with open(os.path.join(self.directory, f"{field}.terms"), "r", encoding="utf-8") as file:
+                terms = file.read().split("\n")
+            lexicon = np.load(os.path.join(self.directory, f"{field}.lexicon.npz"))
+            with open(os.path.join(self.directory, f"{field}.postings"), "rb") as file:
+                postings = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if lexicon["offsets"].size else b""
+            self._lexicons[field] = (terms if lexicon["offsets"].size else [], lexicon["offsets"], lexicon["lengths"], lexicon["dfs"], postings)
+        return self._lexicons[field]
+
+    def terms(self, field: str, term: str) -> list[str]:
+        """
+        Termy pole odpovídající [term], term končící "*" je prefix
+        """
+        terms = self._lexicon(field)[0]
+        if term.endswith("*"):
+            prefix = term[:-1]
+            return terms[bisect.bisect_left(terms, prefix):bisect.bisect_left(terms, prefix + "\U0010FFFF")]
+        index = bisect.bisect_left(terms, term)
+        return [term] if index < len(terms) and terms[index] == term else []
+
+    def postings(self, field: str, term: str) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+        """
+        (id článků, tf, pozice) termu. U prefixu se postingy všech termů sečtou po článcích (bez pozic)
+        """
+        terms, offsets, lengths, _, postings = self._lexicon(field)
+        decoded = []
+        for match in self.terms(field, term):
+            index = bisect.bisect_left(terms, match)
+            start = int(offsets[index])
+            decoded.append(decode_postings(postings[start:start + int(lengths[index])], FIELDS[field]))
+
+        if not decoded:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), None
+        if len(decoded) == 1:
+            return decoded[0]
+        docs, inverse = np.unique(np.concatenate([docs for docs, _, _ in decoded]), return_inverse=True)
+        return docs, np.bincount(inverse, weights=np.concatenate([tfs for _, tfs, _ in decoded])).astype(np.int64), None
+
+    def document(self, doc: int) -> dict:
+        published_time = self.published[doc]
+        return {
+            "article_name": bytes(self.names[int(self.name_offsets[doc]):int(self.name_offsets[doc + 1])]).decode(),
+            "article_published_time": None if np.isnat(published_time) else str(published_time),
+            "article_comment_count": int(self.comments[doc]),
+        }
+
+    def _recency(self, docs: np.ndarray) -> np.ndarray:
+        # Sekundy od epochy pro řazení od nejnovějšího, články bez data na konec
+        published = self.published[docs].astype(np.int64)
+        return np.where(published == NAT, NAT + 1, published)
+
+    def _date_mask(self, docs: np.ndarray, date_from: str | None, date_to: str | None) -> np.ndarray:
+        # Konec je včetně v přesnosti, v jaké je zadaný - "2022" je celý rok, "2022-03" celý březen
+        published = self.published[docs]
+        mask = ~np.isnat(published)
+        if date_from:
+            mask &= published >= np.datetime64(date_from)
+        if date_to:
+            date_to = np.datetime64(date_to)
+            mask &= published < date_to + np.timedelta64(1, np.datetime_data(date_to.dtype)[0])
+        return mask
+
+    def _match_terms(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        # Všechna slova dotazu (AND), skóre je součet tf
+        terms = []
+        for part in query.split():
+            words = tokenize(part)
+            if part.endswith("*") and words:
+                words[-1] += "*"
+            terms.extend(words)
+
+        docs, scores = None, None
+        for term in terms:
+            term_docs, term_tfs, _ = self.postings("content", term)
+            if docs is None:
+                docs, scores = term_docs, term_tfs
+                continue
+            docs, left, right = np.intersect1d(docs, term_docs, assume_unique=True, return_indices=True)
+            scores = scores[left] + term_tfs[right]
+        return (docs, scores) if docs is not None else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    def _match_phrase(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        # Pozice slova i se posune o i zpět, takže fráze = stejný (článek, pozice) u všech slov, skóre je počet výskytů fráze
+        common = None
+        for offset, word in enumerate(tokenize(query)):
+            docs, tfs, positions = self.postings("content", word)
+            if positions is None:
+                positions = np.empty(0, dtype=np.int64)
+            keys = np.repeat(docs, tfs) * (1 << 32) + positions - offset
+            common = keys if common is None else np.intersect1d(common, keys, assume_unique=True)
+        if common is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.unique(common // (1 << 32), return_counts=True)
+
+    def search(self, query: str = None, phrase=False, author: str = None, keyword: str = None, category: str = None,
+               date_from: str = None, date_to: str = None, k: int | None = 10) -> list[tuple[int, int]]:
+        """
+        Top-k článků jako (id, skóre), k=None vrátí všechny.
+        [query] - slova, která článek musí obsahovat všechna (slovo s "*" na konci je prefix), skóre je součet tf.
+        [phrase] - slova dotazu musí jít přesně za sebou, skóre je počet výskytů fráze.
+        [author], [keyword], [category] - přesné hodnoty, [date_from], [date_to] - ISO datum (i jen rok nebo měsíc).
+        Bez dotazu má každý článek skóre 0 a řadí se od nejnovějšího
+        """
+        docs, scores = None, None
+        if query:
+            docs, scores = self._match_phrase(query) if phrase else self._match_terms(query)
+        for field, value in (("author", author), ("keyword", keyword), ("category", category)):
+            if value is None:
+                continue
+            field_docs = self.postings(field, _normalize(value))[0]
+            if docs is None:
+                docs, scores = field_docs, np.zeros(len(field_docs), dtype=np.int64)
+            else:
+                docs, left, _ = np.intersect1d(docs, field_docs, assume_unique=True, return_indices=True)
+                scores = scores[left]
+        if docs is None:
+            docs, scores = np.arange(len(self)), np.zeros(len(self), dtype=np.int64)
+
+        if date_from or date_to:
+            mask = self._date_mask(docs, date_from, date_to)
+            docs, scores = docs[mask], scores[mask]
+
+        if k is not None and len(docs) > k:
+            top = np.argpartition(-scores, k - 1)[:k] if scores.any() else np.argpartition(-self._recency(docs), k - 1)[:k]
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((-self._recency(docs), -scores))
+        return list(zip(docs[order].tolist(), scores[order].tolist()))
+
+    def facet(self, field: str, date_from: str = None, date_to: str = None) -> list[tuple[str, int]]:
+        """
+        Počet článků pro každou hodnotu pole (category, author, keyword), volitelně jen v rozsahu dat
+        """
+        terms, offsets, lengths, _, postings = self._lexicon(field)
+        mask = self._date_mask(np.arange(len(self)), date_from, date_to) if date_from or date_to else None
+        counts = []
+        for term, offset, length in zip(terms, offsets.tolist(), lengths.tolist()):
+            docs = decode_postings(postings[offset:offset + length], FIELDS[field])[0]
+            count = int(mask[docs].sum()) if mask is not None else len(docs)
+            if count:
+                counts.append((term, count))
+        return sorted(counts, key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="On-disk inverted index over the scraped articles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the index from JSON/NDJSON dumps or redis://...#key")
+    build.add_argument("index", help="index directory")
+    build.add_argument("inputs", nargs="+")
+    build.add_argument("--block-postings", type=int, default=BLOCK_POSTINGS, help="postings kept in memory before a block is written")
+    search = commands.add_parser("search", help="top-k articles for a query and filters")
+    search.add_argument("index")
+    search.add_argument("query", nargs="?")
+    search.add_argument("--phrase", action="store_true")
+    search.add_argument("--author")
+    search.add_argument("--keyword")
+    search.add_argument("--category")
+    search.add_argument("--from", dest="date_from")
+    search.add_argument("--to", dest="date_to")
+    search.add_argument("-k", type=int, default=10)
+    facet = commands.add_parser("facet", help="article counts per category/author/keyword")
+    facet.add_argument("index")
+    facet.add_argument("field", choices=["category", "author", "keyword"])
+    facet.add_argument("--from", dest="date_from")
+    facet.add_argument("--to", dest="date_to")
+    args = parser.parse_args()
+
+    started = perf_counter()
+    if args.command == "build":
+        print(f"Indexed {build_index(args.inputs, args.index, args.block_postings)} articles")
+    elif args.command == "search":
+        index = InvertedIndex(args.index)
+        started = perf_counter()
+        for doc, score in index.search(args.query, args.phrase, args.author, args.keyword, args.category, args.date_from, args.date_to, args.k):
+            article = index.document(doc)
+            print(f"{score:>6} {article['article_published_time']} {article['article_name']}")
+    else:
+        index = InvertedIndex(args.index)
+        started = perf_counter()
+        for value, count in index.facet(args.field, args.date_from, args.date_to):
+            print(f"{count:>8} {value}")
+    print(f"{(perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,62 @@
+import heapq
+from collections import Counter
+
+# Přibližné počítání nejčastějších slov v pevné paměti. Přesný Counter přes celý korpus drží miliony
+# tvarů slov, pro top-N ale stačí heavy hitters sketch.
+
+
+class FrequentItems:
+    """
+    Misra-Gries (deterministická obdoba SpaceSaving) s dávkovými updaty.
+    Drží nejvýš 2 * [capacity] počítadel. Když jich je víc, od všech se odečte (capacity + 1)-tá největší
+    hodnota a nekladné se zahodí. Každý počet je tak podhodnocený nejvýš o [error] a
+    error <= total / (capacity + 1). Slovo s větším skutečným počtem než error ve sketchi určitě zůstane.
+    Dva sketche jde sloučit přes [merge] se stejnou zárukou (Agarwal et al., Mergeable Summaries).
+    """
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.error = 0
+        self.total = 0
+
+    def update(self, items: list) -> None:
+        """
+        Přičte seznam výskytů. Po update se musí zavolat [compact], jinak paměť neomezuje nic
+        """
+        self.counts.update(items)
+        self.total += len(items)
+
+    def compact(self) -> None:
+        # Ořezává se až při dvojnásobku, takže cena ořezání se rozloží mezi mnoho updatů
+        if len(self.counts) > 2 * self.capacity:
+            self.__prune()
+
+    def __prune(self) -> None:
+        if len(self.counts) <= self.capacity:
+            return
+        delta = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.error += delta
+        self.counts = Counter({item: count - delta for item, count in self.counts.items() if count > delta})
+
+    def merge(self, other: "FrequentItems") -> "FrequentItems":
+        self.counts.update(other.counts)
+        self.error += other.error
+        self.total += other.total
+        self.__prune()
+        return self
+
+    @property
+    def error_bound(self) -> float:
+        """
+        Zaručená horní mez chyby nezávislá na průběhu, skutečná chyba je [error]
+        """
+        return self.total / (self.capacity + 1)
+
+    def items(self):
+        return self.counts.items()
+
+    def __getitem__(self, item) -> int:
+        return self.counts[item]
+
+    def __len__(self) -> int:
+        return len(self.counts)
@@ -0,0 +1,363 @@
+import os
+import io
+import sys
+import gzip
+import json
+import pickle
+import ijson
+import hashlib
+import numpy as np
+import concurrent.futures
+from datetime import datetime
+from functools import reduce, partial
+from collections import Counter
+from sketches import FrequentItems
+from dedup import find_clusters
+from tokenizer import tokenize
+
+# Paralelní výpočet statistik nad korpusem článků. Vstup se rozdělí na shardy (bajtové rozsahy NDJSON souboru,
+# případně celé komprimované soubory), každý proces spočítá částečný CorpusStats a výsledky se nakonec sloučí
+# přes CorpusStats.merge. Merge je asociativní, takže nezáleží na tom, jak velké shardy jsou.
+
+# Kolik shardů na jeden proces - víc shardů vyrovná nerovnoměrně dlouhé články, ale každý shard posílá zpět
+# celý Counter slov, jejichž slučování běží v hlavním procesu
+SHARDS_PER_PROCESS = 2
+
+
+def _slim(article: dict, **extra) -> dict:
+    """
+    Do výsledků si pamatujeme jen to, co se vypisuje - celé články by se zbytečně posílaly mezi procesy
+    """
+    return {
+        "article_name": article.get("article_name"),
+        "article_published_time": article.get("article_published_time"),
+        "article_comment_count": article.get("article_comment_count"),
+        "article_image_count": article.get("article_image_count"),
+        **extra,
+    }
+
+
+def _better(current, candidate, key, lower=False):
+    """
+    Vrátí lepší ze dvou kandidátů, při shodě vyhrává ten dřívější (levý), stejně jako v sekvenčním průchodu
+    """
+    if current is None:
+        return candidate
+    if candidate is None:
+        return current
+    if lower:
+        return candidate if candidate[key] < current[key] else current
+    return candidate if candidate[key] > current[key] else current
+
+
+class CorpusStats:
+    """
+    Částečné agregáty jednoho shardu, [merge] je asociativní slučovací krok
+    [word_sketch_capacity] - místo přesného Counteru slov počítat nejčastější slova přibližně v pevné paměti (FrequentItems)
+    [hasher] - dedup.MinHasher, když se mají hledat téměř stejné články
+    """
+    def __init__(self, covid_top=3, word_sketch_capacity=None, hasher=None):
+        self.covid_top = covid_top
+        self.word_sketch_capacity = word_sketch_capacity or None
+        self.approximate = bool(word_sketch_capacity)
+        self.hasher = hasher
+        # Pozice ve vstupech, po kterou jsou články započítané (bajty u souboru, index u Redisu)
+        self.offsets = {}
+        # Názvy článků a jejich MinHash signatury (num_perm * 4 B na článek)
+        self.signature_names = []
+        self.signatures = []
+        self.number_of_articles = 0
+        self.number_of_comments = 0
+        self.number_of_words = 0
+        self.title_hashes = Counter()
+
+        self.oldest_article = None
+        self.most_commented_article = None
+        self.most_illustrated_article = None
+        self.article_with_most_words = None
+        self.article_with_least_words = None
+        self.top_covid_articles = []
+
+        self.article_categories = Counter()
+        self.articles_per_year = Counter()
+        self.month_publish_freq = Counter()
+        self.content_freq = FrequentItems(word_sketch_capacity) if self.approximate else Counter()
+        self.article_name_freq = Counter()
+
+    def add(self, item: dict) -> None:
+        self.number_of_articles += 1
+        self.title_hashes[hashlib.md5(str(item["article_name"]).replace(" ", "").encode()).digest()] += 1
+
+        if item["article_published_time"]:
+            published_date = datetime.fromisoformat(item["article_published_time"])
+            self.articles_per_year[published_date.year] += 1
+            self.month_publish_freq[published_date.month] += 1
+
+            if published_date.year == 2021 and item["article_name"]:
+                self.article_name_freq.update(tokenize(item["article_name"]))
+
+            if self.oldest_article is None or published_date < self.oldest_article["published_date"]:
+                self.oldest_article = _slim(item, published_date=published_date)
+
+        if item["article_content"]:
+            words = tokenize(item["article_content"])
+
+            if self.hasher is not None:
+                signature = self.hasher.signature(item["article_content"])
+                if signature is not None:
+                    self.signature_names.append(item["article_name"])
+                    self.signatures.append(signature)
+            words_len = len(words)
+            self.number_of_words += words_len
+
+            # Výskyt "covid" se dopočítá z rozdílu ve Counteru, bez druhého průchodu slovy
+            covid_before = self.content_freq["covid"]
+            self.content_freq.update(words)
+            covid_count = self.content_freq["covid"] - covid_before
+            if self.approximate:
+                self.content_freq.compact()
+
+            article = _slim(item, content_w_length=words_len)
+            self.article_with_most_words = _better(self.article_with_most_words, article, "content_w_length")
+            if words_len > 10:
+                self.article_with_least_words = _better(self.article_with_least_words, article, "content_w_length", lower=True)
+
+            if covid_count > 0 and (len(self.top_covid_articles) < self.covid_top or covid_count > self.top_covid_articles[-1][1]):
+                self.top_covid_articles = self.__top_covid(self.top_covid_articles + [(article, covid_count)])
+
+        if item["article_category"]:
+            self.article_categories[item["article_category"]] += 1
+
+        if item["article_image_count"]:
+            self.most_illustrated_article = _better(self.most_illustrated_article, _slim(item), "article_image_count")
+
+        if item["article_comment_count"]:
+            self.number_of_comments += item["article_comment_count"]
+            self.most_commented_article = _better(self.most_commented_article, _slim(item), "article_comment_count")
+
+    def __top_covid(self, articles: list) -> list:
+        # sort je stabilní, při shodě zůstává dřívější článek
+        return sorted(articles, key=lambda x: x[1], reverse=True)[:self.covid_top]
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        """
+        Přičte [other] (shard, který je ve vstupu až za tímto) a vrátí self
+        """
+        self.number_of_articles += other.number_of_articles
+        self.number_of_comments += other.number_of_comments
+        self.number_of_words += other.number_of_words
+        self.title_hashes.update(other.title_hashes)
+
+        self.oldest_article = _better(self.oldest_article, other.oldest_article, "published_date", lower=True)
+        self.most_commented_article = _better(self.most_commented_article, other.most_commented_article, "article_comment_count")
+        self.most_illustrated_article = _better(self.most_illustrated_article, other.most_illustrated_article, "article_image_count")
+        self.article_with_most_words = _better(self.article_with_most_words, other.article_with_most_words, "content_w_length")
+        self.article_with_least_words = _better(self.article_with_least_words, other.article_with_least_words, "content_w_length", lower=True)
+        self.top_covid_articles = self.__top_covid(self.top_covid_articles + other.top_covid_articles)
+
+        self.article_categories.update(other.article_categories)
+        self.articles_per_year.update(other.articles_per_year)
+        self.month_publish_freq.update(other.month_publish_freq)
+        if self.approximate:
+            self.content_freq.merge(other.content_freq)
+        else:
+            self.content_freq.update(other.content_freq)
+        self.article_name_freq.update(other.article_name_freq)
+        self.signature_names.extend(other.signature_names)
+        self.signatures.extend(other.signatures)
+        self.offsets.update(other.offsets)
+        return self
+
+    def near_duplicate_clusters(self) -> list[list[str]]:
+        """
+        Clustery názvů téměř stejných článků podle MinHash/LSH
+        """
+        if not self.signatures:
+            return []
+        clusters = find_clusters(self.hasher, np.vstack(self.signatures))
+        return [[self.signature_names[index] for index in cluster] for cluster in clusters]
+
+    @property
+    def config(self) -> tuple:
+        """
+        Nastavení, se kterým musí být spočítané obě strany merge
+        """
+        return self.covid_top, self.word_sketch_capacity, self.hasher.config if self.hasher else None
+
+    @property
+    def number_of_duplicates(self) -> int:
+        return sum(1 for count in self.title_hashes.values() if count > 1)
+
+
+def _open_binary(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        import zstandard
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True))
+    return open(path, "rb")
+
+
+def _is_line_per_article(path: str) -> bool:
+    """
+    NDJSON i JSON pole z DataStore.dump_articles mají jeden článek na řádek, staré dumpy s indent=4 ne
+    """
+    with _open_binary(path) as file:
+        for line in file:
+            line = line.strip().rstrip(b",")
+            if line in (b"", b"[", b"]"):
+                continue
+            return line.startswith(b"{") and line.endswith(b"}")
+    return True
+
+
+def _redis_source(path: str):
+    """
+    Zdroj redis://[:heslo@]host:port/db#klíč - články přímo ze seznamu scraperu (výchozí klíč data_idnes_articles)
+    """
+    import redis
+    url, _, key = path.partition("#")
+    # Bez dekódování - články můžou být binární (msgpack + zstd, viz article_codec.py scraperu)
+    return redis.Redis.from_url(url), key or "data_idnes_articles"
+
+
+def _article_codec(client, dictionaries="article_dictionaries"):
+    """
+    Codec scraperu, který čte JSON i binární záznamy, slovníky bere ze stejného Redisu
+    """
+    # Codec je ve složce scraperu, cesta se přidá jen při prvním čtení z Redisu
+    scraper_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "01_idnes_scraper"))
+    if scraper_dir not in sys.path:
+        sys.path.append(scraper_dir)
+    from article_codec import ArticleCodec
+    return ArticleCodec(fetch_dictionary=lambda dict_id: client.hget(dictionaries, str(dict_id)))
+
+
+def _source_end(path: str) -> int:
+    """
+    Kam až se dá zdroj číst - délka seznamu v Redisu, u souboru konec posledního celého řádku
+    (scraper/export může zrovna zapisovat další článek)
+    """
+    if path.startswith("redis://"):
+        client, key = _redis_source(path)
+        return client.llen(key)
+
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        position = size
+        while position > 0:
+            chunk_start = max(0, position - 65536)
+            file.seek(chunk_start)
+            newline = file.read(position - chunk_start).rfind(b"\n")
+            if newline >= 0:
+                return chunk_start + newline + 1
+            position = chunk_start
+    return 0
+
+
+def make_shards(paths: list[str], processes: int, offsets: dict[str, int] = None) -> tuple[list[tuple[str, int, int | None]], dict[str, int]]:
+    """
+    Rozdělí vstupy na shardy (path, start, end) a vrátí je spolu s pozicí, kam se který vstup přečte.
+    Nekomprimované soubory s článkem na řádek se dělí na bajtové rozsahy, seznam v Redisu na rozsahy indexů.
+    Komprimované soubory a staré JSON dumpy jsou každý jeden shard (end = None) a nejde do nich přidávat.
+    [offsets] - pozice z checkpointu, čte se jen to, co přibylo
+    """
+    offsets = offsets or {}
+    shards, ends = [], {}
+    for path in paths:
+        if not path.startswith("redis://") and (path.endswith((".gz", ".zst")) or not _is_line_per_article(path)):
+            size = os.path.getsize(path)
+            if path in offsets and offsets[path] != size:
+                raise ValueError(f"{path} changed since the checkpoint, only NDJSON files and Redis can grow")
+            if path not in offsets:
+                shards.append((path, 0, None))
+            ends[path] = size
+            continue
+
+        start, end = offsets.get(path, 0), _source_end(path)
+        if end < start:
+            raise ValueError(f"{path} is shorter than in the checkpoint, delete the checkpoint and start again")
+        count = max(1, processes * SHARDS_PER_PROCESS)
+        bounds = [start + (end - start) * i // count for i in range(count + 1)]
+        shards.extend((path, left, right) for left, right in zip(bounds, bounds[1:]) if right > left)
+        ends[path] = end
+    return shards, ends
+
+
+def read_shard(path: str, start=0, end=None):
+    """
+    Vrací články ze shardu. Řádek patří shardu, ve kterém začíná
+    """
+    if path.startswith("redis://"):
+        client, key = _redis_source(path)
+        codec = _article_codec(client)
+        for index in range(start, end, 10000):
+            for article in client.lrange(key, index, min(index + 10000, end) - 1):
+                yield codec.decode(article)
+        return
+
+    with _open_binary(path) as file:
+        if end is None and not _is_line_per_article(path):
+            yield from ijson.items(file, "item")
+            return
+
+        position = start
+        if start > 0:
+            file.seek(start - 1)
+            position = start - 1 + len(file.readline())
+
+        while end is None or position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            line = line.strip().rstrip(b",")
+            if line in (b"", b"[", b"]"):
+                continue
+            yield json.loads(line)
+
+
+def compute_shard(shard: tuple[str, int, int | None], word_sketch_capacity=None, hasher=None) -> CorpusStats:
+    stats = CorpusStats(word_sketch_capacity=word_sketch_capacity, hasher=hasher)
+    for item in read_shard(*shard):
+        stats.add(item)
+    return stats
+
+
+def compute(paths: list[str], processes: int | None = None, word_sketch_capacity=None, hasher=None, checkpoint: CorpusStats = None) -> CorpusStats:
+    """
+    Spočítá statistiky nad všemi vstupy v [processes] procesech a sloučí je v pořadí vstupu
+    [checkpoint] - dřívější výsledek, přičtou se jen články, které od té doby přibyly
+    """
+    processes = processes or os.cpu_count()
+    stats = checkpoint or CorpusStats(word_sketch_capacity=word_sketch_capacity, hasher=hasher)
+    if stats.config != CorpusStats(word_sketch_capacity=word_sketch_capacity, hasher=hasher).config:
+        raise ValueError("Checkpoint was computed with different settings, delete it or use the same settings")
+
+    shards, ends = make_shards(paths, processes, stats.offsets)
+    compute = partial(compute_shard, word_sketch_capacity=word_sketch_capacity, hasher=hasher)
+    if processes == 1 or len(shards) <= 1:
+        stats = reduce(CorpusStats.merge, map(compute, shards), stats)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            # map drží pořadí shardů, takže výsledek (i při shodách) odpovídá sekvenčnímu průchodu
+            stats = reduce(CorpusStats.merge, executor.map(compute, shards), stats)
+
+    stats.offsets.update(ends)
+    return stats
+
+
+def load_checkpoint(path: str) -> CorpusStats | None:
+    try:
+        with gzip.open(path, "rb") as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(stats: CorpusStats, path: str) -> None:
+    # Zápis přes dočasný soubor, aby pád uprostřed zápisu nepřišel o předchozí checkpoint
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=1) as file:
+        pickle.dump(stats, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
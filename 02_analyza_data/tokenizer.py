@@ -0,0 +1,90 @@
+import os
+import re
+from array import array
+
+# Společná tokenizace pro analýzu (02) i grafy (03). Slovo = posloupnost \w znaků, vše malými písmeny.
+
+WORD_RE = re.compile(r'\w+')
+STOPWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "czech_stopwords.txt")
+
+
+def load_stopwords(file_path=STOPWORDS_FILE) -> frozenset[str]:
+    """
+    Funkce načte seznam stopwordu ukradené z
+    https://raw.githubusercontent.com/stopwords-iso/stopwords-cs/master/stopwords-cs.txt
+    Vrací frozenset, takže `word in stop_words` je O(1) místo průchodu celým seznamem
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        return frozenset(word for word in (line.strip() for line in file) if word)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase celého textu a jeden průchod regexem - bez kopie seznamu slov kvůli .lower()
+    """
+    return WORD_RE.findall(text.lower()) if text else []
+
+
+def remove_stopwords(tokens, stop_words: frozenset[str]) -> list[str]:
+    return [token for token in tokens if token not in stop_words]
+
+
+class TokenStream:
+    """
+    Dávková tokenizace mnoha článků do jednoho proudu tokenů. Slova se ukládají jako id do slovníku
+    v array('I'), hranice článků jsou v [offsets] - článek i má tokeny ids[offsets[i]:offsets[i + 1]].
+    Místo milionů malých seznamů řetězců tak drží 4 B na token a každé různé slovo jen jednou.
+    """
+    def __init__(self):
+        self.vocabulary = {}
+        self.words = []
+        self.ids = array("I")
+        self.offsets = array("Q", [0])
+
+    def add(self, text: str) -> None:
+        vocabulary = self.vocabulary
+        words = self.words
+        for token in tokenize(text):
+            token_id = vocabulary.get(token)
+            if token_id is None:
+                token_id = vocabulary[token] = len(words)
+                words.append(token)
+            self.ids.append(token_id)
+        self.offsets.append(len(self.ids))
+
+    def extend(self, texts) -> "TokenStream":
+        for text in texts:
+            self.add(text)
+        return self
+
+    @classmethod
+    def from_texts(cls, texts) -> "TokenStream":
+        return cls().extend(texts)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def tokens(self, index: int) -> list[str]:
+        return [self.words[token_id] for token_id in self.ids[self.offsets[index]:self.offsets[index + 1]]]
+
+    def article_lengths(self):
+        """
+        Počet slov v každém článku jako numpy pole
+        """
+        import numpy as np
+        return np.diff(np.frombuffer(self.offsets, dtype=np.uint64)).astype(np.int64)
+
+    def word_frequencies(self):
+        """
+        Počet výskytů každého slova ze slovníku (index = id slova) jako numpy pole
+        """
+        import numpy as np
+        return np.bincount(np.frombuffer(self.ids, dtype=np.uint32), minlength=len(self.words))
+
+    def word_length_histogram(self):
+        """
+        Histogram délek všech tokenů - index = délka slova, hodnota = počet výskytů
+        """
+        import numpy as np
+        lengths = np.fromiter(map(len, self.words), dtype=np.int64, count=len(self.words))
+        return np.bincount(lengths, weights=self.word_frequencies()).astype(np.int64) if len(self.words) else np.zeros(1, dtype=np.int64)
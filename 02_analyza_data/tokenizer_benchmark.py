@@ -0,0 +1,70 @@
+import re
+import json
+import random
+import argparse
+from time import perf_counter
+from itertools import islice
+from collections import Counter
+from tokenizer import tokenize, load_stopwords, remove_stopwords, TokenStream
+
+# Micro-benchmark tokenizace - původní kód (re.findall + .lower() v list comprehension, stopwords v seznamu)
+# proti sdílenému tokenizeru. Vstup je NDJSON s články, bez vstupu se použijí náhodně poskládané texty.
+
+
+def load_texts(path: str | None, limit: int) -> list[str]:
+    if path is None:
+        random.seed(0)
+        words = list(load_stopwords()) + ["Praha", "vláda", "řekl", "korun", "covid", "Hokejisté", "ČEZ", "2023", "místostarosta"]
+        return [" ".join(random.choices(words, k=random.randint(50, 800))) + "." for _ in range(limit)]
+
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line)["article_content"] or "" for line in islice(file, limit)]
+
+
+def legacy(texts: list[str], stop_words: list[str]) -> Counter:
+    counter = Counter()
+    for text in texts:
+        words = re.findall(r'\w+', text)
+        words = [word.lower() for word in words]
+        counter.update(words)
+    return Counter({word: freq for word, freq in counter.items() if word not in stop_words})
+
+
+def shared(texts: list[str], stop_words: frozenset[str]) -> Counter:
+    counter = Counter()
+    for text in texts:
+        counter.update(tokenize(text))
+    return Counter({word: freq for word, freq in counter.items() if word not in stop_words})
+
+
+def batch(texts: list[str], stop_words: frozenset[str]) -> Counter:
+    tokens = TokenStream.from_texts(texts)
+    frequencies = tokens.word_frequencies()
+    return Counter({word: int(frequencies[i]) for i, word in enumerate(tokens.words) if word not in stop_words})
+
+
+def measure(name: str, function, *args):
+    started = perf_counter()
+    result = function(*args)
+    print(f"{name:>22}: {perf_counter() - started:8.3f} s")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the shared tokenizer against the original analysis code")
+    parser.add_argument("input", nargs="?", help="NDJSON file with articles, random texts if omitted")
+    parser.add_argument("--limit", type=int, default=20000, help="number of articles")
+    args = parser.parse_args()
+
+    texts = load_texts(args.input, args.limit)
+    stop_words = load_stopwords()
+    print(f"{len(texts)} articles, {sum(map(len, texts)) / 1e6:.1f} M characters")
+
+    expected = measure("findall + lower + list", legacy, texts, list(stop_words))
+    assert measure("tokenize + frozenset", shared, texts, stop_words) == expected
+    assert measure("TokenStream batch", batch, texts, stop_words) == expected
+
+    tokens = tokenize(" ".join(texts[:1000]))
+    stop_list = list(stop_words)
+    measure("stopwords in list", lambda: remove_stopwords(tokens, stop_list))
+    measure("stopwords in frozenset", lambda: remove_stopwords(tokens, stop_words))
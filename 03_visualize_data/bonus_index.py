@@ -1,42 +1,68 @@
+import os
+from datetime import datetime
 from pymongo import MongoClient
 
 def get_database():
-   client = MongoClient("localhost", 27017)
+   client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
    return client["scraper"]
-  
-if __name__ == "__main__":   
-  
-    db = get_database()
-    articles = db["articles"]
 
+# Jednotlivé dotazy jako funkce, aby je šlo změřit v mongo_benchmark.py
+
+def random_article(db):
     # Najděte jeden náhodný článek
-    random_article = list(articles.aggregate([{ "$sample": { "size": 1 } }]))
-    print(random_article)
-
-    number_of_articles = db.command("collstats", "articles")["count"]
-    print(f"Počet článků: {number_of_articles}")
-
-    average_photos = list(articles.aggregate([{ "$group": { "_id": None, "average_image_count": {"$avg": "$article_image_count"} } }]))
-    print(f"Průměrný počet článků: {average_photos}")
-    
-    photos_gt_100 = articles.count_documents({"article_comment_count": {"$gt": 100}})
-    print(f"Počet článku, kde komentáře > 100: {photos_gt_100}")
-
-    grouped_categories = list(db.articles.aggregate([
-        {
-            "$match": {
-                "article_published_time": {
-                    "$gte": "2022-01-01T00:00:00Z",
-                    "$lt": "2023-01-01T00:00:00Z"
-                }
-            }
-        },
-        {
-            "$group": {
-                "_id": "$article_category",
-                "count": {"$sum": 1}
+    return list(db.articles.aggregate([{ "$sample": { "size": 1 } }]))
+
+def number_of_articles(db):
+    return db.command("collstats", "articles")["count"]
+
+def average_photos(db):
+    return list(db.articles.aggregate([{ "$group": { "_id": None, "average_image_count": {"$avg": "$article_image_count"} } }]))
+
+COMMENTS_GT_100 = {"article_comment_count": {"$gt": 100}}
+
+# article_published_time je Date (viz mongo_loader.py), porovnání s řetězci s "Z" na konci neodpovídalo
+# uloženému formátu bez časové zóny
+CATEGORIES_2022 = [
+    {
+        "$match": {
+            "article_published_time": {
+                "$gte": datetime(2022, 1, 1),
+                "$lt": datetime(2023, 1, 1)
             }
         }
-    ]))
+    },
+    {
+        "$group": {
+            "_id": "$article_category",
+            "count": {"$sum": 1}
+        }
+    }
+]
+
+def comments_gt_100(db):
+    return db.articles.count_documents(COMMENTS_GT_100)
+
+def categories_2022(db):
+    return list(db.articles.aggregate(CATEGORIES_2022))
+
+QUERIES = {
+    "random_article": random_article,
+    "number_of_articles": number_of_articles,
+    "average_photos": average_photos,
+    "comments_gt_100": comments_gt_100,
+    "categories_2022": categories_2022,
+}
+
+if __name__ == "__main__":
+
+    db = get_database()
+
+    print(random_article(db))
+
+    print(f"Počet článků: {number_of_articles(db)}")
+
+    print(f"Průměrný počet článků: {average_photos(db)}")
+
+    print(f"Počet článku, kde komentáře > 100: {comments_gt_100(db)}")
 
-    print(grouped_categories)
\ No newline at end of file
+    print(categories_2022(db))
@@ -1,70 +1,42 @@
-import re
-import json
-import ijson
-import pandas as pd
+import os
+import numpy as np
 import matplotlib.pyplot as plt
 from datetime import  datetime
+from plot_cube import PlotCube, load_cube, KEYWORDS, WORD_COUNT_BIN
 
-def split_into_smaller_parts(path: str, number_of_articles: int, parts = 5) -> None:
-    """
-    Funkce vezme soubour (velkýýýýý, proto ten json streamuju) a rozhodí ho do několika částí
-    """
+# Všechny grafy se kreslí z předpočítané kostky (viz plot_cube.py), ne z jednotlivých článků
 
-    split_when = [ *[int(number_of_articles/parts)*i for i in range(1,parts)], number_of_articles ]
-
-    p_file = 0
-    part=1
-
-    with open(path, "rb") as file:
-        print("Starting part 1")
-        articles = []
-        for item in ijson.items(file, "item"):
-            articles.append(item)
-
-            if part < len(split_when)+1 and p_file > split_when[part-1]:
-                with open(f"part_{part}.json", "w", encoding="utf-8") as part_file:
-                    json.dump(articles, part_file, indent=4, ensure_ascii=False)
-
-                part += 1
-                print(f"Starting part {part}")
-                articles = []
-            
-            if part >= len(split_when)+1:
-                break
-
-            p_file += 1
-
-def plot_articles_in_time(df) -> None:
-    df_grouped = df.groupby(df['article_published_time'].dt.to_period('Y')).size()
-    df_grouped.index = df_grouped.index.strftime('%Y-%m')
+def plot_articles_in_time(cube: PlotCube) -> None:
+    df_grouped = cube.counts.groupby('year')['articles'].sum()
+    df_grouped.index = df_grouped.index.astype(str)
 
     plt.figure(figsize=(12, 6))
     plt.plot(df_grouped.index, df_grouped.values, marker='o', linestyle='-')
     plt.title("Články v čase")
     plt.xlabel("Rok publikace")
     plt.ylabel("Počet článků")
-    plt.xticks(rotation=90)  
+    plt.xticks(rotation=90)
 
     plt.grid()
     plt.show()
 
-def plot_bar_chart_per_year(df) -> None:
-    df_grouped = df['publication_year'].value_counts().sort_index()
+def plot_bar_chart_per_year(cube: PlotCube) -> None:
+    df_grouped = cube.counts.groupby('year')['articles'].sum().sort_index()
 
     plt.figure(figsize=(12, 6))
     df_grouped.plot(kind='bar', width=0.8)
     plt.title("Články v letech")
     plt.xlabel("Rok")
     plt.ylabel("Počet článků")
-    plt.xticks(rotation=90)  
+    plt.xticks(rotation=90)
     plt.grid(axis='y')
     plt.tight_layout()
     plt.show()
 
-def plot_relation_comments_length(df):
-
+def plot_relation_comments_length(cube: PlotCube):
+    # Bodů by bylo 1.4M, stačí náhodný vzorek z kostky
     plt.figure(figsize=(10, 6))
-    plt.scatter(df['article_length'], df['article_comment_count'], alpha=0.5)
+    plt.scatter(cube.sample['article_length'], cube.sample['article_comment_count'], alpha=0.5)
     plt.title("Závislost délky na počtu komentářů")
     plt.xlabel("Délka článku (počet slov)")
     plt.ylabel("Počet komentářů")
@@ -72,22 +44,23 @@ def plot_relation_comments_length(df):
     plt.tight_layout()
     plt.show()
 
-def plot_pie_chart_category(df):
-    category_counts = df['article_category'].value_counts()
+def plot_pie_chart_category(cube: PlotCube):
+    category_counts = cube.counts.groupby('article_category')['articles'].sum().sort_values(ascending=False)
 
     plt.figure(figsize=(8, 8))
     plt.pie(category_counts, labels=category_counts.index, autopct='%1.0f%%', startangle=140)
     plt.title("Počet článků v kategorii")
-    plt.axis('equal')  
+    plt.axis('equal')
 
     plt.show()
 
-def plot_histogram_number_of_words(df):
-    df['word_count'] = df['article_content'].apply(lambda x: len(x.split()))
-
+def plot_histogram_number_of_words(cube: PlotCube):
+    # Histogram z kostky je po WORD_COUNT_BIN slovech, tady se jen přeskládá do 20 sloupců
+    word_counts = cube.word_counts.sum(axis=0).to_numpy()
+    last_bin = np.flatnonzero(word_counts)[-1] + 1 if word_counts.any() else 1
 
     plt.figure(figsize=(10, 6))
-    plt.hist(df['word_count'], bins=20, edgecolor='k')
+    plt.hist(np.arange(len(word_counts)) * WORD_COUNT_BIN, weights=word_counts, bins=20, range=(0, last_bin * WORD_COUNT_BIN), edgecolor='k')
     plt.title("Histogram počtu slov ve článku")
     plt.xlabel("Počet slov")
     plt.ylabel("Frekvence")
@@ -95,12 +68,12 @@ def plot_histogram_number_of_words(df):
     plt.tight_layout()
     plt.show()
 
-def plot_histogram_length_of_words(df):
-    words = ' '.join(df['article_content']).split()
-    unique_word_lengths = [len(word) for word in words]
+def plot_histogram_length_of_words(cube: PlotCube):
+    # Histogram délek (index = délka, hodnota = počet slov) spočítaný po částech při stavění kostky
+    length_counts = cube.word_lengths
 
     plt.figure(figsize=(10, 6))
-    plt.hist(unique_word_lengths, bins=100, edgecolor='k', range=(0, 20)) 
+    plt.hist(np.arange(len(length_counts)), weights=length_counts, bins=100, edgecolor='k', range=(0, 20))
     plt.title("Délka slov v článcích")
     plt.xlabel("Délka slov")
     plt.xlim(0,2500)
@@ -108,29 +81,19 @@ def plot_histogram_length_of_words(df):
     plt.grid()
     plt.tight_layout()
     plt.show()
-    
-
-def plot_covid_timeline(df):
-    def count_word_occurrences(text, word):
-        return len(re.findall(r'\b' + re.escape(word) + r'\b', text, re.IGNORECASE))
 
-    df['covid_occurrences'] = df['article_name'].apply(lambda text: count_word_occurrences(str(text), "koronavirus"))
-    df['vaccine_occurrences'] = df['article_name'].apply(lambda text: count_word_occurrences(str(text), 'vakcína'))
-    
 
+def plot_covid_timeline(cube: PlotCube):
     # Oseknutí dat
     start_date = datetime(2019, 1, 1)
     end_date = datetime.now()
-    df = df[(df['article_published_time'] >= start_date) & (df['article_published_time'] <= end_date)]
-
-    df_grouped = df.groupby(df['article_published_time'].dt.to_period('M'))[['covid_occurrences', 'vaccine_occurrences']].sum()
-    df_grouped.index = df_grouped.index.strftime('%Y-%m')
-
-
+    months = cube.counts.dropna(subset=['year', 'month']).groupby(['year', 'month'])[cube.keywords].sum()
+    months = months[[(start_date.year, start_date.month) <= (year, month) <= (end_date.year, end_date.month) for year, month in months.index]]
+    months.index = [f"{year}-{month:02d}" for year, month in months.index]
 
     plt.figure(figsize=(20, 6))
-    plt.plot(df_grouped.index, df_grouped['covid_occurrences'], marker='o', linestyle='-', label='koronavirus')
-    plt.plot(df_grouped.index, df_grouped['vaccine_occurrences'], marker='o', linestyle='-', label='Vakcína')
+    for keyword in cube.keywords:
+        plt.plot(months.index, months[keyword], marker='o', linestyle='-', label=keyword)
     plt.title('Výskyt kovidu a vakcín v průběhu let')
     plt.xlabel('Čas')
     plt.ylabel('Počet')
@@ -142,11 +105,11 @@ def plot_covid_timeline(df):
 
     plt.show()
 
-def plot_by_weekday(df):
-    articles_by_day = df['article_published_time'].dt.day_name().value_counts()
+def plot_by_weekday(cube: PlotCube):
     ordered_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    # Jinak to normálně totiž začíná v neděli
-    articles_by_day = articles_by_day.reindex(ordered_days)
+    # Weekday v kostce je 0 = pondělí, takže pořadí sedí a nezačíná v neděli
+    articles_by_day = cube.counts.groupby('weekday')['articles'].sum().reindex(range(7), fill_value=0)
+    articles_by_day.index = ordered_days
 
     plt.figure(figsize=(10, 6))
     articles_by_day.plot(kind='bar', )
@@ -158,22 +121,20 @@ def plot_by_weekday(df):
     plt.show()
 
 if __name__ == "__main__":
-    # split_into_smaller_parts("./03_visualize_data/part_5.json", 1_400_000)
-    
-    with open("./part_1.json", "r", encoding="utf-8") as file:
-        data = json.load(file)
-    df = pd.DataFrame(data)
-
-    df['article_published_time'] = pd.to_datetime(df['article_published_time'])
-    df['publication_year'] = df['article_published_time'].dt.year
-    df['publication_month'] = df['article_published_time'].dt.month
-    df['article_length'] = df['article_content'].apply(lambda x: len(x.split()))
-
-    # plot_articles_in_time(df)
-    # plot_bar_chart_per_year(df)
-    # plot_relation_comments_length(df)
-    # plot_pie_chart_category(df)
-    # plot_histogram_number_of_words(df)
-    # plot_histogram_length_of_words(df)
-    # plot_covid_timeline(df)
-    # plot_by_weekday(df)
\ No newline at end of file
+    # Kostka se přepočítá jen při změně vstupu, jinak se načte z PLOT_CACHE
+    cube = load_cube(
+        os.getenv("PLOT_INPUT", "../01_idnes_scraper/idnes_articles_data.json"),
+        cache_file=os.getenv("PLOT_CACHE", "plot_cube.pkl.gz"),
+        chunk_size=int(os.getenv("PLOT_CHUNK_SIZE", 50000)),
+        keywords=os.getenv("PLOT_KEYWORDS", ",".join(KEYWORDS)).split(","),
+        keyword_field=os.getenv("PLOT_KEYWORD_FIELD", "article_name"),
+    )
+
+    # plot_articles_in_time(cube)
+    # plot_bar_chart_per_year(cube)
+    # plot_relation_comments_length(cube)
+    # plot_pie_chart_category(cube)
+    # plot_histogram_number_of_words(cube)
+    # plot_histogram_length_of_words(cube)
+    # plot_covid_timeline(cube)
+    # plot_by_weekday(cube)
@@ -0,0 +1,105 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+# Tokenizer je sdílený s analýzou dat
+ANALYSIS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data"))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_DIR)
+from tokenizer import TokenStream
+from loader import iter_chunks
+
+# Počítání výskytů mnoha klíčových slov najednou. Texty části se jednou tokenizují do TokenStreamu, termy
+# se porovnají jen se slovníkem části (každé různé slovo jednou) a výskyty v článcích se pak sečtou
+# vektorově přes numpy - jeden průchod pro libovolný počet termů místo regexu pro každý term a článek.
+
+
+class KeywordMatcher:
+    """
+    [terms] - hledaná slova, term končící hvězdičkou je prefix ("vakcín*" najde vakcína, vakcíny, vakcínou...),
+    takže jeden term pokryje české tvary slova. Porovnává se s tokeny z tokenizeru (malá písmena, celá slova)
+    """
+    def __init__(self, terms: list[str]):
+        self.terms = list(terms)
+        self.exact = {}
+        self.prefixes = {}
+        for index, term in enumerate(self.terms):
+            word = term.lower()
+            if word.endswith("*"):
+                self.prefixes.setdefault(word[:-1], []).append(index)
+            else:
+                self.exact.setdefault(word, []).append(index)
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes})
+
+    def match(self, word: str) -> list[int]:
+        """
+        Indexy termů, kterým odpovídá slovo (jedno slovo může odpovídat víc termům)
+        """
+        indexes = list(self.exact.get(word, ()))
+        for length in self.prefix_lengths:
+            if length > len(word):
+                break
+            indexes.extend(self.prefixes.get(word[:length], ()))
+        return indexes
+
+    def count_tokens(self, tokens: TokenStream) -> np.ndarray:
+        """
+        Matice počtů výskytů (článek x term) pro již tokenizované texty
+        """
+        number_of_terms = len(self.terms)
+        # Slovník -> termy jako CSR: termy slova i jsou term_indexes[starts[i]:starts[i] + term_counts[i]]
+        matches = [self.match(word) for word in tokens.words]
+        term_counts = np.fromiter(map(len, matches), dtype=np.int64, count=len(matches))
+        term_indexes = np.fromiter((index for indexes in matches for index in indexes), dtype=np.int64, count=int(term_counts.sum()))
+        starts = np.cumsum(term_counts) - term_counts
+
+        ids = np.frombuffer(tokens.ids, dtype=np.uint32)
+        offsets = np.frombuffer(tokens.offsets, dtype=np.uint64)
+        positions = np.flatnonzero(term_counts[ids]) if len(ids) else np.empty(0, dtype=np.int64)
+        matched = ids[positions]
+        repeats = term_counts[matched]
+
+        # Každý nalezený token se rozvine na všechny jeho termy a (článek, term) se sečte jedním bincountem
+        articles = np.repeat(np.searchsorted(offsets, positions, side="right") - 1, repeats)
+        within = np.arange(int(repeats.sum())) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        terms = term_indexes[np.repeat(starts[matched], repeats) + within]
+        counts = np.bincount(articles * number_of_terms + terms, minlength=len(tokens) * number_of_terms)
+        return counts.reshape(len(tokens), number_of_terms)
+
+    def count(self, texts) -> np.ndarray:
+        return self.count_tokens(TokenStream.from_texts(texts))
+
+
+def keyword_timeline(path: str, terms: list[str], field="article_name", chunk_size=50000) -> pd.DataFrame:
+    """
+    Počet výskytů každého termu v [field] (article_name nebo article_content) po měsících - řádky jsou měsíce,
+    sloupce termy
+    """
+    matcher = KeywordMatcher(terms)
+    parts = []
+    for chunk in iter_chunks(path, ["article_published_time", field], chunk_size):
+        counts = pd.DataFrame(matcher.count(chunk[field].fillna("")), columns=matcher.terms)
+        counts["month"] = chunk["article_published_time"].dt.to_period("M").to_numpy()
+        parts.append(counts.groupby("month").sum())
+
+    if not parts:
+        return pd.DataFrame(columns=matcher.terms)
+    return pd.concat(parts).groupby(level=0).sum().sort_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Month x term occurrence matrix over the scraped articles")
+    parser.add_argument("input", help="JSON array, NDJSON or Parquet dataset with articles")
+    parser.add_argument("terms", nargs="+", help="terms to count, 'vakcín*' matches every word starting with 'vakcín'")
+    parser.add_argument("--field", choices=["article_name", "article_content"], default="article_name")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--output", help="CSV file, printed if omitted")
+    args = parser.parse_args()
+
+    timeline = keyword_timeline(args.input, args.terms, args.field, args.chunk_size)
+    if args.output:
+        timeline.to_csv(args.output)
+    else:
+        print(timeline.to_string())
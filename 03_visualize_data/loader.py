@@ -0,0 +1,123 @@
+import os
+import sys
+import ijson
+import numpy as np
+import pandas as pd
+from itertools import islice
+from pandas.api.types import union_categoricals
+
+# Tokenizer je sdílený s analýzou dat, aby grafy počítaly slova stejně
+ANALYSIS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data"))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_DIR)
+from tokenizer import TokenStream
+
+# Načítání článků pro grafy po částech. Z každé části se spočítají odvozené sloupce (počet slov, rok, měsíc),
+# nechají se jen sloupce, které grafy potřebují, v kompaktních typech a obsah článků se hned zahodí.
+# Díky tomu se vejde celý korpus (1.4M článků) a ne jen pětina jako s json.load.
+
+# Sloupce, se kterými pracují grafy v index.py
+PLOT_COLUMNS = ["article_name", "article_published_time", "article_comment_count", "article_category", "article_length", "publication_year", "publication_month"]
+DERIVED_COLUMNS = {"article_length", "publication_year", "publication_month"}
+CATEGORY_COLUMNS = ["article_category"]
+
+
+def _raw_columns(columns: list[str], with_word_lengths: bool) -> list[str]:
+    raw = [column for column in columns if column not in DERIVED_COLUMNS]
+    if {"publication_year", "publication_month"} & set(columns) and "article_published_time" not in raw:
+        raw.append("article_published_time")
+    if ("article_length" in columns or with_word_lengths) and "article_content" not in raw:
+        raw.append("article_content")
+    return raw
+
+
+def iter_raw_chunks(path: str, columns: list[str], chunk_size=50000):
+    """
+    Vrací DataFrame po [chunk_size] článcích. Vstup je Parquet dataset (adresář nebo .parquet), NDJSON
+    (i .gz/.zst) nebo JSON pole z DataStore.dump_articles (čte se streamovaně přes ijson)
+    """
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(path, format="parquet", partitioning="hive").to_batches(columns=columns, batch_size=chunk_size):
+            yield batch.to_pandas()
+        return
+
+    if ".ndjson" in path or path.endswith(".jsonl"):
+        with pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, compression="infer") as reader:
+            for chunk in reader:
+                yield chunk.reindex(columns=columns)
+        return
+
+    with open(path, "rb") as file:
+        items = ijson.items(file, "item")
+        while chunk := list(islice(items, chunk_size)):
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def _compact(chunk: pd.DataFrame, columns: list[str], word_lengths: np.ndarray | None) -> pd.DataFrame:
+    if "article_content" in chunk and ("article_length" in columns or word_lengths is not None):
+        tokens = TokenStream.from_texts(chunk["article_content"].fillna(""))
+        if "article_length" in columns:
+            chunk["article_length"] = tokens.article_lengths().astype(np.int32)
+        if word_lengths is not None:
+            histogram = tokens.word_length_histogram()
+            word_lengths[:len(histogram)] += histogram[:len(word_lengths)]
+
+    if "article_published_time" in chunk:
+        # Parquet už má timestamp, z JSONu je to řetězec - neplatné datum bude NaT
+        published_time = pd.to_datetime(chunk["article_published_time"].replace("", None), errors="coerce")
+        if "publication_year" in columns:
+            chunk["publication_year"] = published_time.dt.year.astype("Int16")
+        if "publication_month" in columns:
+            chunk["publication_month"] = published_time.dt.month.astype("Int8")
+        chunk["article_published_time"] = published_time.astype("datetime64[s]")
+
+    for column in ["article_comment_count", "article_image_count"]:
+        if column in chunk:
+            chunk[column] = chunk[column].fillna(0).astype(np.int32)
+    for column in CATEGORY_COLUMNS:
+        if column in chunk:
+            chunk[column] = chunk[column].astype("category")
+    if "article_is_premium" in chunk:
+        chunk["article_is_premium"] = chunk["article_is_premium"].fillna(False).astype(bool)
+
+    return chunk[columns]
+
+
+def _concat(chunks: list[pd.DataFrame], columns: list[str]) -> pd.DataFrame:
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    # concat kategorií s různými hodnotami by je převedl na object, takže se kategorie sjednotí zvlášť
+    categories = {column: union_categoricals([chunk[column] for chunk in chunks]) for column in CATEGORY_COLUMNS if column in columns}
+    df = pd.concat([chunk.drop(columns=list(categories)) for chunk in chunks], ignore_index=True)
+    for column, values in categories.items():
+        df[column] = values
+    return df[columns]
+
+
+def iter_chunks(path: str, columns: list[str] = PLOT_COLUMNS, chunk_size=50000, word_lengths: np.ndarray | None = None):
+    """
+    Vrací části článků už jen s [columns] v kompaktních typech. Když je zadané [word_lengths],
+    přičte se do něj histogram délek slov z každé části
+    """
+    for chunk in iter_raw_chunks(path, _raw_columns(columns, word_lengths is not None), chunk_size):
+        yield _compact(chunk, columns, word_lengths)
+
+
+def load_articles(path: str, columns: list[str] = PLOT_COLUMNS, chunk_size=50000, with_word_lengths=False, max_word_length=100) -> pd.DataFrame:
+    """
+    Načte články po částech jen s [columns] (včetně odvozených article_length, publication_year, publication_month).
+    [with_word_lengths] - spočítat i histogram délek všech slov (df.attrs["word_length_histogram"], index = délka),
+    aby graf délek slov nepotřeboval obsah článků
+    """
+    word_lengths = np.zeros(max_word_length + 1, dtype=np.int64) if with_word_lengths else None
+
+    chunks = []
+    for chunk in iter_chunks(path, columns, chunk_size, word_lengths):
+        chunks.append(chunk)
+        print(f"[loader] {sum(map(len, chunks))} articles")
+
+    df = _concat(chunks, columns)
+    if word_lengths is not None:
+        df.attrs["word_length_histogram"] = word_lengths
+    return df
@@ -0,0 +1,76 @@
+import argparse
+from time import perf_counter
+from bonus_index import get_database, QUERIES, COMMENTS_GT_100, CATEGORIES_2022
+from mongo_loader import create_indexes
+
+# Změří dotazy z bonus_index.py bez indexů (jen _id) a s indexy z mongo_loader.py proti lokálnímu mongod.
+# Pozor, shodí a znovu vytvoří indexy kolekce scraper.articles.
+
+
+def measure(db, repeat: int) -> dict[str, float]:
+    times = {}
+    for name, query in QUERIES.items():
+        query(db)  # zahřátí cache
+        started = perf_counter()
+        for _ in range(repeat):
+            query(db)
+        times[name] = (perf_counter() - started) / repeat * 1000
+    return times
+
+
+def plans(db) -> dict[str, str]:
+    """
+    Vítězné plány dotazů, u kterých se indexy projeví (COLLSCAN vs. IXSCAN/COUNT_SCAN)
+    """
+    return {
+        "comments_gt_100": _stages(db.command("explain", {"count": "articles", "query": COMMENTS_GT_100})),
+        "categories_2022": _stages(db.command("explain", {"aggregate": "articles", "pipeline": CATEGORIES_2022, "cursor": {}})),
+    }
+
+
+def _find_winning_plan(explain):
+    # Podle verze a enginu (classic/SBE) je queryPlanner nahoře nebo ve stages[0].$cursor
+    if isinstance(explain, dict):
+        if "queryPlanner" in explain:
+            winning_plan = explain["queryPlanner"]["winningPlan"]
+            return winning_plan.get("queryPlan", winning_plan)
+        values = explain.values()
+    elif isinstance(explain, list):
+        values = explain
+    else:
+        return None
+    for value in values:
+        if (winning_plan := _find_winning_plan(value)) is not None:
+            return winning_plan
+    return None
+
+
+def _stages(explain: dict) -> str:
+    stages = []
+    winning_plan = _find_winning_plan(explain)
+    while winning_plan:
+        stages.append(winning_plan["stage"])
+        winning_plan = winning_plan.get("inputStage") or (winning_plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the bonus_index.py queries without and with the loader's indexes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = get_database()
+    articles = db["articles"]
+    print(f"{articles.estimated_document_count()} articles")
+
+    articles.drop_indexes()
+    before, plans_before = measure(db, args.repeat), plans(db)
+    create_indexes(articles)
+    after, plans_after = measure(db, args.repeat), plans(db)
+
+    print(f"{'query':>20} {'before [ms]':>12} {'after [ms]':>12} {'speedup':>8}")
+    for name in QUERIES:
+        print(f"{name:>20} {before[name]:12.1f} {after[name]:12.1f} {before[name] / after[name]:7.1f}x")
+
+    for name in plans_before:
+        print(f"{name}: {plans_before[name]} -> {plans_after[name]}")
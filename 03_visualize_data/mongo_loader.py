@@ -0,0 +1,112 @@
+import os
+import sys
+import argparse
+import concurrent.futures
+from time import perf_counter
+from datetime import datetime
+from itertools import islice
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+from bonus_index import get_database
+
+# Čtení dumpu (JSON pole, NDJSON, .gz/.zst) je sdílené s analýzou dat
+ANALYSIS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data"))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.append(ANALYSIS_DIR)
+from stats_engine import read_shard
+
+# Nahrání dumpu ze scraperu do MongoDB (scraper.articles) pro dotazy v bonus_index.py. Dump se čte proudově,
+# vkládá se po dávkách přes neuspořádaný insert_many v několika vláknech a article_published_time se převádí
+# na Date, aby šly dotazy na rozsah dat přes index. Indexy se vytváří až po nahrání - jeden build je rychlejší
+# než udržovat index při každém insertu.
+
+# Indexy pro dotazy v bonus_index.py:
+# - count_documents na article_comment_count > 100 je pak jen průchod částí indexu (COUNT_SCAN)
+# - $match na rozsah article_published_time + $group podle kategorie se pokryje složeným indexem bez čtení dokumentů
+INDEXES = [
+    IndexModel([("article_comment_count", ASCENDING)], name="article_comment_count"),
+    IndexModel([("article_published_time", ASCENDING), ("article_category", ASCENDING)], name="article_published_time_category"),
+]
+
+
+def parse_published_time(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _insert(articles, batch: list[dict]) -> int:
+    try:
+        return len(articles.insert_many(batch, ordered=False, bypass_document_validation=True).inserted_ids)
+    except BulkWriteError as error:
+        # Neuspořádaný insert vloží všechno, co jde - chybné dokumenty se jen vypíšou
+        print(f"[mongo] {len(error.details['writeErrors'])} documents failed: {error.details['writeErrors'][0]['errmsg']}")
+        return error.details["nInserted"]
+
+
+def load_articles(articles, paths: list[str], batch_size=5000, workers=4) -> int:
+    """
+    Nahraje články ze vstupů (JSON dump, NDJSON, .gz/.zst) do kolekce [articles].
+    [workers] - kolik dávek se vkládá najednou, v paměti je nejvýš 2 * workers dávek
+    """
+    def batches():
+        for path in paths:
+            items = read_shard(path)
+            while batch := list(islice(items, batch_size)):
+                for article in batch:
+                    article["article_published_time"] = parse_published_time(article.get("article_published_time"))
+                yield batch
+
+    inserted = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in batches():
+            pending.add(executor.submit(_insert, articles, batch))
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                inserted += sum(future.result() for future in done)
+                print(f"[mongo] {inserted} articles")
+        inserted += sum(future.result() for future in concurrent.futures.as_completed(pending))
+    return inserted
+
+
+def convert_dates(articles) -> int:
+    """
+    Převede article_published_time uložený jako řetězec (kolekce nahraná dřív přes mongoimport) na Date
+    přímo na serveru, neplatné a prázdné datum bude null
+    """
+    result = articles.update_many(
+        {"article_published_time": {"$type": "string"}},
+        [{"$set": {"article_published_time": {"$dateFromString": {"dateString": "$article_published_time", "onError": None, "onNull": None}}}}],
+    )
+    return result.modified_count
+
+
+def create_indexes(articles) -> list[str]:
+    return articles.create_indexes(INDEXES)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load the scraped articles into MongoDB (scraper.articles)")
+    parser.add_argument("inputs", nargs="*", help="JSON array, NDJSON or .gz/.zst dumps")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--drop", action="store_true", help="drop the collection before loading")
+    parser.add_argument("--convert-dates", action="store_true", help="convert string publish times already in the collection to Date")
+    args = parser.parse_args()
+
+    articles = get_database()["articles"]
+    if args.drop:
+        articles.drop()
+
+    started = perf_counter()
+    if args.inputs:
+        print(f"Inserted {load_articles(articles, args.inputs, args.batch_size, args.workers)} articles in {perf_counter() - started:.1f} s")
+    if args.convert_dates:
+        print(f"Converted {convert_dates(articles)} publish times")
+
+    started = perf_counter()
+    print(f"Created indexes {create_indexes(articles)} in {perf_counter() - started:.1f} s")
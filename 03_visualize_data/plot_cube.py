@@ -0,0 +1,131 @@
+import os
+import gzip
+import pickle
+import numpy as np
+import pandas as pd
+from loader import iter_chunks
+from keywords import KeywordMatcher
+
+# Předpočítaná kostka pro všechny grafy. Jedním průchodem přes korpus se posčítají články, komentáře, slova
+# a výskyty klíčových slov (KeywordMatcher) podle (rok, měsíc, den v týdnu, kategorie), k tomu histogramy
+# počtu slov (podle roku) a délek slov a vzorek článků pro scatter. Kostka má desítky tisíc řádků místo 1.4M článků, takže se z ní
+# grafy kreslí v milisekundách. Ukládá se na disk a přepočítá se, jen když se změní vstup nebo nastavení.
+
+CUBE_DIMENSIONS = ["year", "month", "weekday", "article_category"]
+CUBE_COLUMNS = ["article_name", "article_published_time", "article_comment_count", "article_category", "article_length"]
+KEYWORDS = ["koronavir*", "vakcín*"]
+# Histogram počtu slov po 25 slovech, články nad 10000 slov padnou do posledního binu
+WORD_COUNT_BIN = 25
+WORD_COUNT_BINS = 400
+MAX_WORD_LENGTH = 100
+SAMPLE_SIZE = 20000
+
+
+class PlotCube:
+    """
+    [keywords] - termy pro KeywordMatcher, jejichž výskyty se počítají do kostky (sloupec pro každý term)
+    [keyword_field] - kde se termy hledají, article_name nebo article_content
+    [sample_size] - počet náhodně vybraných článků (délka, komentáře) pro graf závislosti
+    """
+    def __init__(self, keywords=KEYWORDS, sample_size=SAMPLE_SIZE, keyword_field="article_name", seed=1):
+        self.keywords = list(keywords)
+        self.keyword_field = keyword_field
+        self.sample_size = sample_size
+        self.number_of_articles = 0
+        self.counts = None
+        self.word_counts = None
+        self.word_lengths = np.zeros(MAX_WORD_LENGTH + 1, dtype=np.int64)
+        self.sample = pd.DataFrame({"article_length": [], "article_comment_count": [], "key": []})
+        self._rng = np.random.default_rng(seed)
+        self._matcher = KeywordMatcher(self.keywords)
+        self._counts_parts = []
+        self._word_counts_parts = []
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """
+        Přičte část článků z loader.iter_chunks (sloupce CUBE_COLUMNS a keyword_field)
+        """
+        published_time = chunk["article_published_time"]
+        keys = pd.DataFrame({
+            "year": published_time.dt.year.astype("Int16"),
+            "month": published_time.dt.month.astype("Int8"),
+            "weekday": published_time.dt.weekday.astype("Int8"),
+            "article_category": chunk["article_category"].astype(object),
+        })
+        values = pd.DataFrame({
+            "articles": np.ones(len(chunk), dtype=np.int64),
+            "comments": chunk["article_comment_count"].astype(np.int64),
+            "words": chunk["article_length"].astype(np.int64),
+        })
+        keyword_counts = self._matcher.count(chunk[self.keyword_field].fillna(""))
+        for index, keyword in enumerate(self.keywords):
+            values[keyword] = keyword_counts[:, index]
+        self._counts_parts.append(pd.concat([keys, values], axis=1).groupby(CUBE_DIMENSIONS, dropna=False).sum())
+
+        bins = np.minimum(chunk["article_length"].to_numpy() // WORD_COUNT_BIN, WORD_COUNT_BINS - 1)
+        self._word_counts_parts.append(pd.DataFrame({"year": keys["year"], "bin": bins}).groupby(["year", "bin"], dropna=False).size())
+
+        # Reservoir přes náhodné klíče - drží se sample_size článků s nejmenším klíčem, což je rovnoměrný vzorek
+        sample = pd.DataFrame({
+            "article_length": chunk["article_length"].to_numpy(),
+            "article_comment_count": chunk["article_comment_count"].to_numpy(),
+            "key": self._rng.random(len(chunk)),
+        })
+        self.sample = pd.concat([self.sample, sample], ignore_index=True).nsmallest(self.sample_size, "key").reset_index(drop=True)
+        self.number_of_articles += len(chunk)
+
+    def finish(self) -> "PlotCube":
+        """
+        Sečte mezivýsledky z jednotlivých částí do výsledných tabulek
+        """
+        self.counts = pd.concat(self._counts_parts).groupby(level=CUBE_DIMENSIONS, dropna=False).sum().reset_index() if self._counts_parts else None
+        if self._word_counts_parts:
+            word_counts = pd.concat(self._word_counts_parts).groupby(level=["year", "bin"], dropna=False).sum()
+            self.word_counts = word_counts.unstack("bin", fill_value=0).reindex(columns=range(WORD_COUNT_BINS), fill_value=0)
+        self._counts_parts = []
+        self._word_counts_parts = []
+        return self
+
+
+def build_cube(path: str, chunk_size=50000, keywords=KEYWORDS, sample_size=SAMPLE_SIZE, keyword_field="article_name") -> PlotCube:
+    cube = PlotCube(keywords, sample_size, keyword_field)
+    columns = CUBE_COLUMNS if keyword_field in CUBE_COLUMNS else CUBE_COLUMNS + [keyword_field]
+    for chunk in iter_chunks(path, columns, chunk_size, cube.word_lengths):
+        cube.add(chunk)
+        print(f"[cube] {cube.number_of_articles} articles")
+    return cube.finish()
+
+
+def input_fingerprint(path: str) -> list[tuple[str, int, int]]:
+    """
+    Velikost a čas změny vstupu, u Parquet datasetu všech jeho souborů
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    return [(file, (stat := os.stat(file)).st_size, stat.st_mtime_ns) for file in files]
+
+
+def load_cube(path: str, cache_file="plot_cube.pkl.gz", chunk_size=50000, keywords=KEYWORDS, sample_size=SAMPLE_SIZE, keyword_field="article_name") -> PlotCube:
+    """
+    Vrátí kostku z [cache_file], pokud odpovídá vstupu i nastavení, jinak ji spočítá a uloží
+    """
+    # Hlavička cache je vstup i nastavení, takže se neshoduje ani s cache ze starší verze kostky
+    header = (input_fingerprint(path), (list(keywords), keyword_field, sample_size, WORD_COUNT_BIN, WORD_COUNT_BINS))
+    try:
+        with gzip.open(cache_file, "rb") as file:
+            cached_header, cube = pickle.load(file)
+        if cached_header == header:
+            return cube
+        print("[cube] input changed, rebuilding")
+    except FileNotFoundError:
+        pass
+
+    cube = build_cube(path, chunk_size, keywords, sample_size, keyword_field)
+    # Zápis přes dočasný soubor, aby pád uprostřed zápisu nenechal rozbitou cache
+    tmp_path = f"{cache_file}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=1) as file:
+        pickle.dump((header, cube), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_file)
+    return cube
@@ -0,0 +1,189 @@
+import os
+import argparse
+from pyspark import StorageLevel
+from pyspark.sql import SparkSession, functions as F
+from pyspark.sql.types import StructType, StructField, StringType, LongType, ArrayType, BooleanType
+
+# Statistiky z 02_analyza_data (index.py) nad celým korpusem z iDNES.cz přes Spark DataFrame API.
+# Vstup je Parquet dataset (výchozí, export scraperu do idnes_articles.parquet) nebo NDJSON export (i .gz) - oba
+# Spark čte paralelně po částech. JSON pole z dump_data() jde rozdělit jen celé, čte ho jeden task.
+# Master je local[*] (všechna jádra, bez clusteru), na docker clusteru SPARK_MASTER=spark://spark:7077.
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "01_idnes_scraper", "idnes_articles.parquet")
+
+MONTHS = [
+    "Leden", "Únor", "Březen", "Duben", "Květen", "Červen",
+    "Červenec", "Srpen", "Září", "Říjen", "Listopad", "Prosinec"
+]
+
+SCHEMA = StructType([
+    StructField("article_name", StringType()),
+    StructField("article_opener", StringType()),
+    StructField("article_published_time", StringType()),
+    StructField("article_comment_count", LongType()),
+    StructField("article_content", StringType()),
+    StructField("article_image_count", LongType()),
+    StructField("article_author", ArrayType(StringType())),
+    StructField("article_keywords", ArrayType(StringType())),
+    StructField("article_category", StringType()),
+    StructField("article_is_premium", BooleanType()),
+])
+
+
+def load_stopwords(file_path: str) -> list[str]:
+    with open(file_path, "r", encoding="utf-8") as file:
+        return sorted({word for word in (line.strip() for line in file) if word})
+
+
+def read_articles(spark: SparkSession, paths: list[str]):
+    """
+    Načte všechny vstupy do jednoho DataFrame jen se sloupci pro statistiky, article_published_time jako timestamp.
+    row_id = (pořadí vstupu, pořadí článku ve vstupu) drží pořadí ze vstupu i po repartition
+    """
+    frames = []
+    for index, path in enumerate(paths):
+        json_array = False
+        if path.rstrip("/").endswith(".parquet") or os.path.isdir(path):
+            frame = spark.read.parquet(path)
+        else:
+            # JSON pole z dump_data() je přes víc řádků, NDJSON má článek na řádek
+            json_array = path.endswith(".json")
+            frame = spark.read.json(path, schema=SCHEMA, multiLine=json_array)
+        frame = frame.withColumn("row_id", F.struct(F.lit(index).alias("input"), F.monotonically_increasing_id().alias("row")))
+        if json_array:
+            # multiLine JSON nejde rozdělit, celý soubor přečte jeden task - aspoň další fáze poběží paralelně
+            print(f"{path}: JSON array is read by a single task, use the NDJSON or Parquet export for large dumps")
+            frame = frame.repartition(spark.sparkContext.defaultParallelism)
+        # Parquet má čas jako timestamp a počty jako int32, JSON řetězec a long - sjednotí se typy pro union
+        frames.append(frame.select(
+            "row_id",
+            F.col("article_name").cast("string"),
+            F.col("article_published_time").cast("timestamp"),
+            F.col("article_comment_count").cast("long"),
+            F.col("article_content").cast("string"),
+            F.col("article_image_count").cast("long"),
+            F.col("article_category").cast("string"),
+        ))
+
+    articles = frames[0]
+    for frame in frames[1:]:
+        articles = articles.unionByName(frame)
+    return articles
+
+
+def tokenize(column):
+    # Stejně jako tokenizer.tokenize - lowercase a slova \w+, (?U) aby \W bral i česká písmena jako slovo
+    return F.array_remove(F.split(F.lower(column), r"(?U)\W+"), "")
+
+
+def top(frame, *order):
+    """
+    První řádek podle [order], při shodě vyhrává článek, který je ve vstupu dřív (row_id)
+    """
+    return frame.orderBy(*order, "row_id").first()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statistics from 02_analyza_data over the scraped corpus with Spark DataFrames")
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT], help="Parquet dataset (default: the scraper's Parquet export), NDJSON (.ndjson, .gz) or JSON array (.json, read by a single task)")
+    parser.add_argument("--master", default=os.getenv("SPARK_MASTER", "local[*]"))
+    parser.add_argument("--stopwords", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_analyza_data", "czech_stopwords.txt"))
+    args = parser.parse_args()
+
+    spark = (
+        SparkSession.builder.master(args.master).appName("IdnesStats")
+        # Časy v datech jsou bez časové zóny, nemají se posouvat podle zóny driveru
+        .config("spark.sql.session.timeZone", "UTC")
+        .getOrCreate()
+    )
+    stop_words = F.broadcast(spark.createDataFrame([(word,) for word in load_stopwords(args.stopwords)], ["word"]))
+
+    raw = read_articles(spark, args.inputs)
+    has_content = F.col("article_content").isNotNull() & (F.col("article_content") != "")
+    words = tokenize(F.col("article_content"))
+
+    # Jeden řádek na článek bez obsahu - malý, takže se drží v paměti pro všechny další agregace
+    articles = raw.select(
+        "row_id", "article_name", "article_comment_count", "article_image_count", "article_category",
+        F.col("article_published_time").alias("published"),
+        F.md5(F.regexp_replace(F.coalesce(F.col("article_name"), F.lit("None")), " ", "")).alias("title_hash"),
+        F.when(has_content, F.size(words)).alias("words"),
+        F.when(has_content, F.size(F.filter(words, lambda word: word == "covid"))).alias("covid"),
+    ).persist(StorageLevel.MEMORY_AND_DISK)
+
+    # Frekvence slov v obsahu bez stopwords - reduce po slovech s částečnou agregací na executorech
+    content_freq = (
+        raw.where(has_content)
+        .select(F.explode(words).alias("word"))
+        .groupBy("word").count()
+        .join(stop_words, "word", "left_anti")
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+
+    totals = articles.agg(
+        F.count("*").alias("articles"),
+        F.sum(F.when(F.col("article_comment_count") > 0, F.col("article_comment_count")).otherwise(0)).alias("comments"),
+        F.sum(F.coalesce("words", F.lit(0))).alias("words"),
+    ).first()
+    number_of_duplicates = articles.groupBy("title_hash").count().where(F.col("count") > 1).count()
+
+    # Datum se formátuje ve Sparku (UTC), collect by timestamp převedl do časové zóny driveru
+    oldest_article = top(articles.where(F.col("published").isNotNull()).withColumn("article_published_time", F.date_format("published", "yyyy-MM-dd'T'HH:mm:ss")), F.col("published").asc())
+    most_commented_article = top(articles.where(F.col("article_comment_count") > 0), F.col("article_comment_count").desc())
+    most_illustrated_article = top(articles.where(F.col("article_image_count") > 0), F.col("article_image_count").desc())
+    article_with_most_words = top(articles.where(F.col("words").isNotNull()), F.col("words").desc())
+    article_with_least_words = top(articles.where(F.col("words") > 10), F.col("words").asc())
+    top_covid_articles = articles.where(F.col("covid") > 0).orderBy(F.col("covid").desc(), "row_id").limit(3).collect()
+
+    average_length = content_freq.agg(F.avg(F.length("word"))).first()[0]
+    most_common = content_freq.where(F.length("word") < 6).orderBy(F.col("count").desc(), "word").limit(8).collect()
+
+    dated = articles.where(F.col("published").isNotNull())
+    months = dated.groupBy(F.month("published").alias("month")).count().orderBy(F.col("count").desc(), "month").collect()
+    articles_per_year = dated.groupBy(F.year("published").alias("year")).count().orderBy("year").collect()
+    most_common_article_names = (
+        dated.where((F.year("published") == 2021) & F.col("article_name").isNotNull() & (F.col("article_name") != ""))
+        .select(F.explode(tokenize(F.col("article_name"))).alias("word"))
+        .groupBy("word").count()
+        .join(stop_words, "word", "left_anti")
+        .orderBy(F.col("count").desc(), "word").limit(5).collect()
+    )
+    article_categories = (
+        articles.where(F.col("article_category").isNotNull() & (F.col("article_category") != ""))
+        .groupBy("article_category").count().orderBy(F.col("count").desc(), "article_category").collect()
+    )
+
+    print(f"Number of articles: {totals['articles']}")
+    print(f"Number of duplicites: {number_of_duplicates}")
+    print(f"Oldest article: {oldest_article['article_published_time']}")
+    print(f"Total number of comments: {totals['comments']}")
+    print(f"Total number of words: {totals['words']}")
+    print(f"Most commented article: {most_commented_article['article_name']} with {most_commented_article['article_comment_count']} comments")
+    print(f"Most illustrated article: {most_illustrated_article['article_name']} with {most_illustrated_article['article_image_count']} photos")
+    print(f"Most words in article: {article_with_most_words['article_name']} with {article_with_most_words['words']} words")
+    print(f"Most words in article: {article_with_least_words['article_name']} with {article_with_least_words['words']} words")
+    print(f"Average length of word: {average_length}")
+
+    print("Top three articles with the most occurrences of 'covid':")
+    for i, article in enumerate(top_covid_articles):
+        print(f"{i + 1}: {article['article_name']} with {article['covid']} covid-19 occurrences")
+
+    print("5 most used words in article names for articles published in 2021:")
+    for row in most_common_article_names:
+        print(f"{row['word']}: {row['count']}")
+
+    print(f"Month with the most published articles: {MONTHS[months[0]['month'] - 1]} with {months[0]['count']} articles.")
+    print(f"Month with the least published articles: {MONTHS[months[-1]['month'] - 1]} with {months[-1]['count']} articles.")
+
+    print("Most common words in content with < 6 words:")
+    for row in most_common:
+        print(f"{row['word']}: {row['count']}")
+
+    for row in articles_per_year:
+        print(f"Year: {row['year']}, Number of Articles: {row['count']}")
+
+    print(f"Number of unique categories: {len(article_categories)}")
+    for row in article_categories:
+        print(f"Category: {row['article_category']}, Number of Articles: {row['count']}")
+
+    spark.stop()
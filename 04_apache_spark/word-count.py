@@ -1,14 +1,33 @@
-from pyspark import SparkConf, SparkContext
-
-conf = SparkConf().setMaster("spark://fa367db42f31:7077").setAppName("WordCount")
-# conf = SparkConf().setMaster("local").setAppName("WordCount")
-sc = SparkContext(conf = conf)
-
-input = sc.textFile("/files/book.txt")
-words = input.flatMap(lambda x: x.split())
-wordCounts = words.countByValue()
-
-for word, count in wordCounts.items():
-    cleanWord = word.encode('ascii', 'ignore')
-    if (cleanWord):
-        print(cleanWord.decode() + " " + str(count))
+import re
+import os
+import sys
+from pyspark import SparkConf, SparkContext
+
+# Počítání slov bez countByValue - ten posílá celou mapu slovo -> počet ze všech partitions na driver.
+# reduceByKey sčítá nejdřív v každé partition (map-side combine) a pak po slovech na executorech,
+# top-N vybere takeOrdered (každá partition pošle jen svých N) a kompletní výsledek se zapíše do souborů.
+
+# Bez SPARK_MASTER běží lokálně na všech jádrech, na docker clusteru SPARK_MASTER=spark://spark:7077
+conf = SparkConf().setMaster(os.getenv("SPARK_MASTER", "local[*]")).setAppName("WordCount")
+sc = SparkContext(conf = conf)
+
+input_path = sys.argv[1] if len(sys.argv) > 1 else "/files/book.txt"
+output_path = sys.argv[2] if len(sys.argv) > 2 else "/files/word-count"
+top_n = int(os.getenv("TOP_N", 20))
+
+WORD_RE = re.compile(r"\w+")
+
+def tokenize(line):
+    # Lowercase a slova \w+ (i s diakritikou), místo split() a zahazování ne-ASCII znaků na driveru
+    return WORD_RE.findall(line.lower())
+
+input = sc.textFile(input_path)
+words = input.flatMap(tokenize)
+# cache - výsledek se použije dvakrát (zápis a top-N)
+wordCounts = words.map(lambda word: (word, 1)).reduceByKey(lambda x, y: x + y).cache()
+
+# Výsledky seřazené podle počtu, jedna partition = jeden soubor part-*
+wordCounts.sortBy(lambda x: x[1], ascending=False).map(lambda x: f"{x[0]}\t{x[1]}").saveAsTextFile(output_path)
+
+for word, count in wordCounts.takeOrdered(top_n, key=lambda x: -x[1]):
+    print(word + " " + str(count))